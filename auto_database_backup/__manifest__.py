@@ -37,12 +37,16 @@
     'data': [
         'security/ir.model.access.csv',
         'data/ir_cron_data.xml',
+        'data/ir_config_parameter_data.xml',
         'data/mail_template_data.xml',
+        'views/db_backup_history_views.xml',
+        'views/db_backup_job_views.xml',
+        'wizard/db_backup_restore_views.xml',
         'views/db_backup_configure_views.xml',
         'wizard/dropbox_auth_code_views.xml',
     ],
     'external_dependencies': {
-        'python': ['dropbox', 'pyncclient', 'boto3', 'nextcloud-api-wrapper','paramiko']},
+        'python': ['dropbox', 'boto3', 'paramiko']},
     'images': ['static/description/banner.gif'],
     'license': 'LGPL-3',
     'installable': True,
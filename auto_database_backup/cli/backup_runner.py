@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import argparse
+import logging
+import signal
+import sys
+import threading
+from odoo import SUPERUSER_ID, api
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.service.server import load_server_wide_modules
+from odoo.tools import config
+from ..tools.backup_destinations import new_http_session
+
+_logger = logging.getLogger(__name__)
+
+
+class BackupRunner(Command):
+    """Run the backup jobs queued by the scheduled actions of Automatic
+    Database Backup, outside of the server processes"""
+    name = 'backup_runner'
+
+    def run(self, args):
+        """Parse the options, then run the jobs of every database until the
+        process is stopped by SIGTERM or SIGINT. A running backup is
+        finished before stopping."""
+        parser = argparse.ArgumentParser(
+            prog=f'{sys.argv[0].split("/")[-1]} {self.name}',
+            description=self.__doc__.strip())
+        parser.add_argument('--poll-interval', type=int, default=60,
+                            help='seconds between two checks of the queue'
+                                 ' when no job is pending (default: 60)')
+        parser.add_argument('--once', action='store_true',
+                            help='exit when no job is pending instead of'
+                                 ' waiting for new jobs')
+        opts, odoo_args = parser.parse_known_args(args)
+        config.parse_config(odoo_args, setup_logging=True)
+        dbnames = config['db_name']
+        if isinstance(dbnames, str):
+            dbnames = [dbname for dbname in dbnames.split(',') if dbname]
+        if not dbnames:
+            sys.exit('backup_runner: give the databases to back up with -d')
+        load_server_wide_modules()
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_args: stop.set())
+        threads = [
+            threading.Thread(target=self._run_database,
+                             args=(dbname, opts, stop),
+                             name=f'backup_runner.{dbname}')
+            for dbname in dbnames
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _run_database(self, dbname, opts, stop):
+        """Run the jobs of database `dbname` with the number of worker
+        threads given by the system parameter
+        `auto_database_backup.max_workers`"""
+        registry = Registry(dbname)
+        if 'db.backup.job' not in registry:
+            _logger.error('Automatic Database Backup is not installed in %s',
+                          dbname)
+            return
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['db.backup.job']._recover_interrupted_jobs()
+            limits = env['db.backup.configure']._get_backup_limits()
+            max_workers = int(env['ir.config_parameter'].get_param(
+                'auto_database_backup.max_workers', 4))
+        _logger.info('Backup runner of %s started with %s workers', dbname,
+                     max(max_workers, 1))
+        with new_http_session() as session:
+            workers = [
+                threading.Thread(target=self._work,
+                                 args=(dbname, limits, session, opts, stop),
+                                 name=f'backup_runner.{dbname}.{index}')
+                for index in range(max(max_workers, 1))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+    def _work(self, dbname, limits, session, opts, stop):
+        """Take the pending jobs of database `dbname` one at a time, each in
+        a transaction of its own, and wait for new jobs when none is
+        pending"""
+        while not stop.is_set():
+            try:
+                registry = Registry(dbname).check_signaling()
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    job = env['db.backup.job']._acquire_job()
+                    job._run(limits, session)
+                    found = bool(job)
+            except Exception as e:
+                _logger.error('Backup runner of %s failed: %s', dbname, e,
+                              exc_info=True)
+                found = False
+            if not found:
+                if opts.once:
+                    return
+                stop.wait(opts.poll_interval)
@@ -20,3 +20,4 @@
 #
 ###############################################################################
 from . import auto_database_backup
+from . import backup_metrics
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import hmac
+from datetime import timezone
+from werkzeug.exceptions import Forbidden, NotFound
+from odoo import http
+from odoo.http import request
+
+# Metrics of the last backup of each configuration: name, field of
+# db.backup.history, help text and factor converting the field to the unit
+# of the metric
+BACKUP_METRICS = [
+    ('odoo_backup_duration_seconds', 'duration',
+     'Duration of the last backup.', 1),
+    ('odoo_backup_dump_duration_seconds', 'dump_duration',
+     'Duration of the database dump of the last backup.', 1),
+    ('odoo_backup_filestore_duration_seconds', 'filestore_duration',
+     'Duration of the incremental filestore backup of the last backup.', 1),
+    ('odoo_backup_upload_duration_seconds', 'upload_duration',
+     'Duration of the upload of the last backup.', 1),
+    ('odoo_backup_retention_duration_seconds', 'retention_duration',
+     'Duration of the removal of old backups by the last backup.', 1),
+    ('odoo_backup_size_bytes', 'file_size',
+     'Size of the last backup.', 1),
+    ('odoo_backup_uncompressed_size_bytes', 'raw_size',
+     'Size of the last backup before compression.', 1),
+    ('odoo_backup_compression_ratio', 'compression_ratio',
+     'Compression ratio of the last backup.', 1),
+    ('odoo_backup_upload_throughput_bytes_per_second', 'upload_speed',
+     'Upload throughput of the last backup.', 1024 * 1024),
+    ('odoo_backup_peak_rss_bytes', 'peak_rss',
+     'Peak resident memory of the dump process of the last backup.',
+     1024 * 1024),
+]
+
+
+class BackupMetrics(http.Controller):
+    """Metrics of the backups in the Prometheus text format. The endpoint is
+    disabled unless the system parameter auto_database_backup.metrics_token
+    is set, the token has to be sent as a bearer token."""
+
+    @http.route('/auto_database_backup/metrics', type='http', auth='public',
+                methods=['GET'], csrf=False, save_session=False)
+    def metrics(self):
+        """Return the metrics of the last backup of every configuration"""
+        token = request.env['ir.config_parameter'].sudo().get_param(
+            'auto_database_backup.metrics_token')
+        if not token:
+            raise NotFound()
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode(),
+                                   f'Bearer {token}'.encode()):
+            raise Forbidden()
+        samples = {name: [] for name, _field, _help, _factor in BACKUP_METRICS}
+        samples['odoo_backup_last_success_timestamp_seconds'] = []
+        samples['odoo_backup_last_run_success'] = []
+        history = request.env['db.backup.history'].sudo()
+        for config in request.env['db.backup.configure'].sudo().search([]):
+            labels = '{configuration="%s",database="%s",destination="%s"}' % (
+                _escape(config.name), _escape(config.db_name),
+                _escape(config.backup_destination))
+            last_run = history.search([
+                ('backup_config_id', '=', config.id),
+                ('state', 'in', ['done', 'failed', 'deleted']),
+                ('name', 'not like', '%.filestore.json'),
+                ('file_type', '=', 'backup'),
+            ], limit=1)
+            if last_run:
+                samples['odoo_backup_last_run_success'].append(
+                    (labels, int(last_run.state != 'failed')))
+            last_backup = config.last_backup_id
+            if not last_backup:
+                continue
+            samples['odoo_backup_last_success_timestamp_seconds'].append(
+                (labels, last_backup.end_time.replace(
+                    tzinfo=timezone.utc).timestamp()))
+            for name, field, _help, factor in BACKUP_METRICS:
+                samples[name].append(
+                    (labels, (last_backup[field] or 0) * factor))
+        helps = {name: help_text
+                 for name, _field, help_text, _factor in BACKUP_METRICS}
+        helps['odoo_backup_last_success_timestamp_seconds'] = \
+            'End of the last successful backup, as a Unix timestamp.'
+        helps['odoo_backup_last_run_success'] = \
+            'Whether the last backup succeeded.'
+        lines = []
+        for name, values in samples.items():
+            lines.append(f'# HELP {name} {helps[name]}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.extend(f'{name}{labels} {value}'
+                         for labels, value in values)
+        return request.make_response(
+            '\n'.join(lines) + '\n',
+            headers=[('Content-Type', 'text/plain; version=0.0.4')])
+
+
+def _escape(value):
+    """Escape a label value of the Prometheus text format"""
+    return str(value or '').replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
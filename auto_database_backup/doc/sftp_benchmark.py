@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+"""Measure the throughput of the SFTP backup destination.
+
+Uploads a file of random data twice to a SFTP server and downloads it back:
+once with the paramiko defaults (``sftp.put`` and ``sftp.get``, 2 MiB
+window) as the module did before, and once through ``SftpDestination``,
+which writes through several SFTP channels in parallel and reads with a
+larger window and a bounded number of read-ahead requests. The module is
+loaded first in both cases, as it is in Odoo: its imports, boto3 among
+them, change how paramiko keeps up with the data received. Run it from the
+addon folder with the python environment of Odoo::
+
+    python doc/sftp_benchmark.py --host backup.example.com --user odoo \
+        --path /backups/benchmark --size 512
+
+The password is asked for on the terminal. The uploaded files are removed
+afterwards. The figures measured are listed in the README."""
+import argparse
+import getpass
+import importlib
+import os
+import sys
+import tempfile
+import time
+import types
+from types import SimpleNamespace
+
+import paramiko
+
+MIB = 1024 * 1024
+
+
+def load_backup_destinations():
+    """Import the backup_destinations module of the addon without Odoo. The
+    tools package is registered without running its __init__, which imports
+    modules depending on Odoo."""
+    if 'backup_tools' not in sys.modules:
+        package = types.ModuleType('backup_tools')
+        package.__path__ = [os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), os.pardir, 'tools')]
+        sys.modules['backup_tools'] = package
+    return importlib.import_module('backup_tools.backup_destinations')
+
+
+def transfer_default(args, password, path, name):
+    """Upload `path` and download it back with the paramiko defaults, return
+    the duration of both transfers"""
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(hostname=args.host, port=args.port, username=args.user,
+                   password=password)
+    try:
+        sftp = client.open_sftp()
+        sftp.chdir(args.path)
+        start = time.monotonic()
+        sftp.put(path, name)
+        upload = time.monotonic() - start
+        start = time.monotonic()
+        sftp.get(name, path + '.download')
+        download = time.monotonic() - start
+        sftp.remove(name)
+        return upload, download
+    finally:
+        client.close()
+        os.remove(path + '.download')
+
+
+def transfer_tuned(args, password, path, name):
+    """Upload `path` and download it back through the SFTP destination of
+    the addon, return the duration of both transfers"""
+    backup_destinations = load_backup_destinations()
+    config = SimpleNamespace(
+        backup_destination='sftp', sftp_host=args.host, sftp_port=args.port,
+        sftp_user=args.user, sftp_password=password, sftp_path=args.path,
+        bandwidth_limit=0)
+    with backup_destinations.SftpDestination(config) as destination:
+        start = time.monotonic()
+        destination.upload_file(path, name)
+        upload = time.monotonic() - start
+        start = time.monotonic()
+        destination.download_file(name, path + '.download')
+        download = time.monotonic() - start
+        destination.delete(name)
+    os.remove(path + '.download')
+    return upload, download
+
+
+def measure_rtt(args, password):
+    """Return the average round trip time of a SFTP request, in ms"""
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(hostname=args.host, port=args.port, username=args.user,
+                   password=password)
+    try:
+        sftp = client.open_sftp()
+        start = time.monotonic()
+        for _i in range(10):
+            sftp.stat('.')
+        return (time.monotonic() - start) * 100
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--path', required=True,
+                        help='Existing folder receiving the test files')
+    parser.add_argument('--size', type=int, default=256,
+                        help='Size of the test file in MiB')
+    args = parser.parse_args()
+    password = getpass.getpass('SFTP password: ')
+    load_backup_destinations()
+    with tempfile.NamedTemporaryFile() as file:
+        for _i in range(args.size):
+            file.write(os.urandom(MIB))
+        file.flush()
+        print('Round trip time: %.1f ms' % measure_rtt(args, password))
+        for label, transfer in [('paramiko defaults', transfer_default),
+                                ('tuned destination', transfer_tuned)]:
+            durations = transfer(args, password, file.name,
+                                 'sftp_benchmark.bin')
+            for direction, duration in zip(('upload', 'download'),
+                                           durations):
+                print('%s, %s: %d MiB in %.1f s, %.1f MiB/s' % (
+                    label, direction, args.size, duration,
+                    args.size / duration))
+
+
+if __name__ == '__main__':
+    main()
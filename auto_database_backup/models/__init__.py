@@ -20,3 +20,6 @@
 #
 ###############################################################################
 from . import db_backup_configure
+from . import db_backup_blob
+from . import db_backup_history
+from . import db_backup_job
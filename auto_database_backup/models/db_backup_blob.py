@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+from odoo import fields, models
+
+
+class DbBackupBlob(models.Model):
+    """Index of the filestore files uploaded to the destination of a backup
+    configuration by the incremental filestore backup"""
+    _name = 'db.backup.blob'
+    _description = 'Database Backup Filestore File'
+
+    backup_config_id = fields.Many2one('db.backup.configure',
+                                       string='Backup Configuration',
+                                       required=True, ondelete='cascade',
+                                       index=True,
+                                       help='Backup configuration which'
+                                            ' uploaded the file')
+    name = fields.Char(string='Name', required=True,
+                       help='Path of the file in the filestore')
+    file_size = fields.Integer(string='Size', help='Size of the file in bytes')
+    last_backup = fields.Datetime(string='Last Backup',
+                                  help='Last backup which included the file')
+
+    _sql_constraints = [
+        ('name_uniq', 'unique (backup_config_id, name)',
+         'A filestore file is only uploaded once per backup configuration.'),
+    ]
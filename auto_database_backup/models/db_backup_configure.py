@@ -21,34 +21,92 @@
 ###############################################################################
 import boto3
 import dropbox
-import errno
 import ftplib
 import json
 import logging
-import nextcloud_client
 import os
 import paramiko
+import re
 import requests
 import shutil
-import subprocess
+import tarfile
 import tempfile
+import time
+import uuid
+import zipfile
 import odoo
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import timedelta
-from nextcloud import NextCloud
-from requests.auth import HTTPBasicAuth
 from werkzeug import urls
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
 from odoo.tools.misc import find_pg_tool, exec_pg_environ
 from odoo.http import request
+from odoo.modules.neutralize import neutralize_database
 from odoo.service import db
+from ..tools.backup_destinations import (BACKUP_DESTINATIONS,
+                                         new_http_session)
+from ..tools.backup_limits import BackupLimits
+from ..tools.db_snapshot import DatabaseSnapshot
+from ..tools.pg_tools import (RESTORE_FILESTORE_WORKERS, PgToolError,
+                              basebackup_command, extract_base_backup,
+                              filestore_path, is_wal_needed, list_wal_files,
+                              restore_backup, run_pg_tool,
+                              write_recovery_config)
+from ..tools.compression import (COMPRESSION_EXTENSIONS, COMPRESSION_LEVELS,
+                                 get_filename_codec, is_codec_available,
+                                 open_compressor, open_decompressor)
+from ..tools.upload_streams import ChecksumWriter, CountingWriter
 
 _logger = logging.getLogger(__name__)
 ONEDRIVE_SCOPE = ['offline_access openid Files.ReadWrite.All']
-MICROSOFT_GRAPH_END_POINT = "https://graph.microsoft.com"
+# Onedrive upload chunks are multiples of 320 KiB of at most 60 MiB
+ONEDRIVE_CHUNK_ALIGNMENT = 320
+ONEDRIVE_MAX_CHUNK_SIZE = 60 * 1024
 GOOGLE_AUTH_ENDPOINT = 'https://accounts.google.com/o/oauth2/auth'
 GOOGLE_TOKEN_ENDPOINT = 'https://accounts.google.com/o/oauth2/token'
-GOOGLE_API_BASE_URL = 'https://www.googleapis.com'  
+BACKUP_EXTENSIONS = {'directory': 'tar'}
+# Seconds between two checks of the database load while a backup waits for
+# it to drop, and longest wait before running the backup anyway
+DB_LOAD_CHECK_INTERVAL = 30
+DB_LOAD_MAX_WAIT = 3600
+# ionice arguments of the IO priorities of pg_dump
+IO_PRIORITY_ARGS = {
+    'low': ['-c', '2', '-n', '7'],
+    'idle': ['-c', '3'],
+}
+# Folder of the destination receiving the filestore files of incremental
+# filestore backups
+FILESTORE_BLOB_FOLDER = 'filestore'
+# Odoo log tables whose data is left out of the dumps by default
+DEFAULT_EXCLUDED_TABLE_DATA = '\n'.join([
+    'auth_totp_rate_limit_log',
+    'bus_bus',
+    'bus_presence',
+    'ir_logging',
+    'ir_profile',
+])
+# Sub folder of the destination receiving the WAL segments of the
+# point-in-time recovery, and folder of the restored cluster into which they
+# are downloaded back
+WAL_FOLDER = 'wal'
+# Tables whose rows are counted in the databases restored by the restore
+# check, the first ones are never empty in an Odoo database
+VERIFY_REQUIRED_TABLES = ['res_company', 'res_users', 'ir_model']
+VERIFY_TABLES = VERIFY_REQUIRED_TABLES + ['res_partner', 'ir_attachment']
+# pg_dump table pattern: table name with optional schema and wildcards
+TABLE_PATTERN = re.compile(r'^[A-Za-z0-9_*?]+(\.[A-Za-z0-9_*?]+)?$')
+# Fields defining where the backups are stored, the index of the filestore
+# files already uploaded is reset when one of them changes
+DESTINATION_LOCATION_FIELDS = [
+    'backup_destination', 'backup_path', 'ftp_host', 'ftp_path', 'sftp_host',
+    'sftp_path', 'google_drive_folder_key', 'dropbox_folder',
+    'onedrive_folder_key', 'domain', 'nextcloud_folder_key',
+    'bucket_file_name', 'aws_folder_name',
+]
+
 
 
 class DbBackupConfigure(models.Model):
@@ -63,11 +121,72 @@ class DbBackupConfigure(models.Model):
                           help='Name of the database')
     master_pwd = fields.Char(string='Master Password', required=True,
                              help='Master password')
+    backup_mode = fields.Selection([
+        ('dump', 'Database Dump'),
+        ('pitr', 'Point-in-Time Recovery'),
+    ], string='Backup Mode', default='dump', required=True,
+        help='Database Dump: pg_dump of the database.\n'
+             'Point-in-Time Recovery: base backup of the whole PostgreSQL'
+             ' cluster with pg_basebackup, followed by the continuous'
+             ' shipping of the WAL segments archived by PostgreSQL, which'
+             ' allows restoring the cluster as it was at any time.')
+    wal_archive_dir = fields.Char(
+        string='WAL Archive Folder',
+        help='Folder of the Odoo server where the archive_command of'
+             ' PostgreSQL copies the WAL segments. They are shipped to the'
+             ' destination every few minutes, then removed from the folder.')
     backup_format = fields.Selection([
         ('zip', 'Zip'),
-        ('dump', 'Dump')
+        ('dump', 'Dump'),
+        ('directory', 'Directory (Parallel)')
     ], string='Backup Format', default='zip', required=True,
         help='Format of the backup')
+    dump_jobs = fields.Integer(string='Dump Jobs', default=4,
+                               help='Number of tables dumped in parallel by'
+                                    ' pg_dump for the Directory format')
+    compression = fields.Selection([
+        ('none', 'None'),
+        ('gzip', 'Gzip'),
+        ('zstd', 'Zstandard'),
+        ('lz4', 'LZ4'),
+    ], string='Compression', default='none', required=True,
+        help='Codec compressing the backup while it is generated. Zstandard'
+             ' compresses on several CPUs in parallel.')
+    compression_level = fields.Integer(string='Compression Level', default=3,
+                                       help='Gzip: 1 to 9, Zstandard: 1 to'
+                                            ' 22, LZ4: 0 to 16')
+    compression_threads = fields.Integer(string='Compression Threads',
+                                         help='Number of threads compressing'
+                                              ' with Zstandard, 0 to use all'
+                                              ' the CPUs')
+    exclude_table_data = fields.Text(
+        string='Excluded Table Data', default=DEFAULT_EXCLUDED_TABLE_DATA,
+        help='Tables whose rows are left out of the backup, one per line.'
+             ' Their structure is kept. Patterns such as mail_tracking_*'
+             ' are allowed.')
+    exclude_transient_data = fields.Boolean(
+        string='Exclude Transient Data', default=True,
+        help='Leave the rows of the transient models (wizards) out of the'
+             ' backup')
+    cpu_priority = fields.Integer(
+        string='CPU Niceness', default=0,
+        help='Niceness of pg_dump, from 0 (normal priority) to 19 (lowest'
+             ' priority)')
+    io_priority = fields.Selection([
+        ('normal', 'Normal'),
+        ('low', 'Low'),
+        ('idle', 'Idle'),
+    ], string='IO Priority', default='normal', required=True,
+        help='IO scheduling priority of pg_dump. Idle only reads the disk'
+             ' when no other process needs it.')
+    bandwidth_limit = fields.Integer(
+        string='Bandwidth Limit (KiB/s)',
+        help='Maximum upload speed to the destination, 0 for no limit')
+    max_db_load = fields.Integer(
+        string='Max Active Queries',
+        help='Wait for the number of queries running on the database to drop'
+             ' to this value before starting the backup, at most one hour.'
+             ' 0 to never wait.')
     backup_destination = fields.Selection([
         ('local', 'Local Storage'),
         ('google_drive', 'Google Drive'),
@@ -101,6 +220,13 @@ class DbBackupConfigure(models.Model):
     ftp_password = fields.Char(string='FTP Password', copy=False,
                                help='FTP password')
     ftp_path = fields.Char(string='FTP Path', help='FTP path details')
+    ftp_use_tls = fields.Boolean(string='Use FTPS',
+                                 help='Connect with explicit TLS (FTPS) and'
+                                      ' encrypt the transfers')
+    ftp_block_size = fields.Integer(string='FTP Block Size (KiB)',
+                                    default=1024,
+                                    help='Size of the blocks sent to the FTP'
+                                         ' server')
     dropbox_client_key = fields.Char(string='Dropbox Client ID', copy=False,
                                      help='Client id of the dropbox')
     dropbox_client_secret = fields.Char(string='Dropbox Client Secret',
@@ -153,6 +279,10 @@ class DbBackupConfigure(models.Model):
                                               help='Token validity date')
     onedrive_folder_key = fields.Char(string='Folder ID',
                                       help='Folder id of the onedrive')
+    onedrive_chunk_size = fields.Integer(
+        string='Onedrive Chunk Size (KiB)', default=10240,
+        help='Size of the chunks uploaded to Onedrive, a multiple of 320 KiB'
+             ' up to 61440 KiB (60 MiB)')
     is_onedrive_token_generated = fields.Boolean(
         string='onedrive Tokens Generated',
         compute='_compute_is_onedrive_token_generated',
@@ -207,6 +337,61 @@ class DbBackupConfigure(models.Model):
     aws_folder_name = fields.Char(string='File Name',
                                   help="field used to store the name of a"
                                        " folder in an Amazon S3 bucket.")
+    aws_multipart_threshold = fields.Integer(
+        string='Multipart Threshold (MiB)', default=8,
+        help='Backups larger than this size are uploaded to Amazon S3 in'
+             ' several parts')
+    aws_multipart_chunksize = fields.Integer(
+        string='Multipart Chunk Size (MiB)', default=8,
+        help='Size of the parts of a multipart upload to Amazon S3, at'
+             ' least 5 MiB')
+    aws_max_concurrency = fields.Integer(
+        string='Upload Concurrency', default=10,
+        help='Number of parts uploaded to Amazon S3 in parallel')
+    stream_upload = fields.Boolean(string='Streaming Upload',
+                                   help='Upload the backup while it is being'
+                                        ' generated instead of writing it to'
+                                        ' a temporary file first. Not'
+                                        ' available with OneDrive, which'
+                                        ' needs the size of the file.')
+    incremental_filestore = fields.Boolean(
+        string='Incremental Filestore',
+        help='Store the filestore files separately at the destination and '
+             'only upload the ones not uploaded yet. Each backup comes with '
+             'a manifest listing the filestore files it uses.')
+    verify_restore = fields.Boolean(
+        string='Verify Restore',
+        help='Restore the last backup into a scratch database every week and'
+             ' check its content, the database is dropped afterwards')
+    restore_jobs = fields.Integer(string='Restore Jobs', default=4,
+                                  help='Number of tables restored in parallel'
+                                       ' by pg_restore, for the Dump and'
+                                       ' Directory formats')
+    backup_history_ids = fields.One2many(
+        'db.backup.history', 'backup_config_id', string='Backup History',
+        help='Files written by the backups of this configuration')
+    last_backup_id = fields.Many2one(
+        'db.backup.history', string='Last Backup',
+        compute='_compute_last_backup_id',
+        help='Last backup of this configuration and its metrics')
+    last_backup_duration = fields.Float(
+        related='last_backup_id.duration', string='Duration (s)')
+    last_dump_duration = fields.Float(
+        related='last_backup_id.dump_duration', string='Dump Duration (s)')
+    last_upload_duration = fields.Float(
+        related='last_backup_id.upload_duration',
+        string='Upload Duration (s)')
+    last_upload_speed = fields.Float(
+        related='last_backup_id.upload_speed',
+        string='Upload Speed (MiB/s)')
+    last_compression_ratio = fields.Float(
+        related='last_backup_id.compression_ratio',
+        string='Compression Ratio')
+    last_peak_rss = fields.Float(related='last_backup_id.peak_rss',
+                                 string='Dump Peak Memory (MiB)')
+    filestore_blob_ids = fields.One2many(
+        'db.backup.blob', 'backup_config_id', string='Uploaded Files',
+        help='Filestore files already uploaded to the destination')
 
     def action_s3cloud(self):
         """If it has aws_secret_access_key, which will perform s3cloud
@@ -255,35 +440,8 @@ class DbBackupConfigure(models.Model):
         if self.domain and self.next_cloud_password and \
                 self.next_cloud_user_name:
             try:
-                ncx = NextCloud(self.domain,
-                                auth=HTTPBasicAuth(self.next_cloud_user_name,
-                                                   self.next_cloud_password))
-                data = ncx.list_folders('/').__dict__
-                if data['raw'].status_code == 207:
-                    self.active = self.hide_active = True
-                    return {
-                        'type': 'ir.actions.client',
-                        'tag': 'display_notification',
-                        'params': {
-                            'type': 'success',
-                            'title': _("Connection Test Succeeded!"),
-                            'message': _("Everything seems properly set up!"),
-                            'sticky': False,
-                        }
-                    }
-                else:
-                    self.active = self.hide_active = False
-                    return {
-                        'type': 'ir.actions.client',
-                        'tag': 'display_notification',
-                        'params': {
-                            'type': 'danger',
-                            'title': _("Connection Test Failed!"),
-                            'message': _("An error occurred while testing the "
-                                         "connection."),
-                            'sticky': False,
-                        }
-                    }
+                with self._get_backup_destination():
+                    pass
             except Exception:
                 self.active = self.hide_active = False
                 return {
@@ -297,6 +455,17 @@ class DbBackupConfigure(models.Model):
                         'sticky': False,
                     }
                 }
+            self.active = self.hide_active = True
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'type': 'success',
+                    'title': _("Connection Test Succeeded!"),
+                    'message': _("Everything seems properly set up!"),
+                    'sticky': False,
+                }
+            }
 
     @api.depends('onedrive_redirect_uri', 'gdrive_redirect_uri')
     def _compute_redirect_uri(self):
@@ -387,8 +556,10 @@ class DbBackupConfigure(models.Model):
             'url': auth_url,
         }
 
-    def generate_onedrive_refresh_token(self):
-        """Generate OneDrive access token from refresh token if expired."""
+    def generate_onedrive_refresh_token(self, session=None):
+        """Generate OneDrive access token from refresh token if expired.
+        The request is sent through the requests.Session `session` if
+        given."""
         base_url = self.get_base_url()
         token_url = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
         headers = {"Content-type": "application/x-www-form-urlencoded"}
@@ -401,7 +572,8 @@ class DbBackupConfigure(models.Model):
             'refresh_token': self.onedrive_refresh_token,
         }
         try:
-            res = requests.post(token_url, data=data, headers=headers)
+            res = (session or requests).post(token_url, data=data,
+                                             headers=headers)
             res.raise_for_status()
             response = res.json() if res.ok else {}
             if response:
@@ -443,8 +615,10 @@ class DbBackupConfigure(models.Model):
             _logger.exception("Bad Microsoft OneDrive request: %s", error.response.content)
             raise error
 
-    def generate_gdrive_refresh_token(self):
-        """Generate Google Drive access token from refresh token if expired."""
+    def generate_gdrive_refresh_token(self, session=None):
+        """Generate Google Drive access token from refresh token if expired.
+        The request is sent through the requests.Session `session` if
+        given."""
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         data = {
             'refresh_token': self.gdrive_refresh_token,
@@ -453,7 +627,8 @@ class DbBackupConfigure(models.Model):
             'grant_type': 'refresh_token',
         }
         try:
-            res = requests.post(GOOGLE_TOKEN_ENDPOINT, data=data, headers=headers)
+            res = (session or requests).post(GOOGLE_TOKEN_ENDPOINT, data=data,
+                                             headers=headers)
             res.raise_for_status()
             response = res.json() if res.ok else {}
             if response:
@@ -521,6 +696,131 @@ class DbBackupConfigure(models.Model):
         outh_result = dbx_auth.finish(auth_code)
         self.dropbox_refresh_token = outh_result.refresh_token
 
+    @api.depends('backup_history_ids')
+    def _compute_last_backup_id(self):
+        """Find the last backup archive stored by the configuration"""
+        for rec in self:
+            rec.last_backup_id = self.env['db.backup.history'].search([
+                ('backup_config_id', '=', rec.id),
+                ('state', 'in', ['done', 'deleted']),
+                ('file_type', '=', 'backup'),
+                ('name', 'not like', '%.filestore.json'),
+            ], limit=1)
+
+    @api.constrains('restore_jobs')
+    def _check_restore_jobs(self):
+        """Validate the number of parallel pg_restore jobs"""
+        for rec in self:
+            if rec.restore_jobs < 1:
+                raise ValidationError(_("Restore Jobs must be at least 1."))
+
+    @api.constrains('dump_jobs')
+    def _check_dump_jobs(self):
+        """Validate the number of parallel pg_dump jobs"""
+        for rec in self:
+            if rec.dump_jobs < 1:
+                raise ValidationError(_("Dump Jobs must be at least 1."))
+
+    @api.constrains('aws_multipart_threshold', 'aws_multipart_chunksize',
+                    'aws_max_concurrency')
+    def _check_aws_transfer(self):
+        """Validate the Amazon S3 transfer settings"""
+        for rec in self:
+            if rec.aws_multipart_threshold < 1:
+                raise ValidationError(_(
+                    "Multipart Threshold must be at least 1 MiB."))
+            if rec.aws_multipart_chunksize < 5:
+                raise ValidationError(_(
+                    "Multipart Chunk Size must be at least 5 MiB."))
+            if rec.aws_max_concurrency < 1:
+                raise ValidationError(_(
+                    "Upload Concurrency must be at least 1."))
+
+    @api.constrains('cpu_priority', 'bandwidth_limit', 'max_db_load')
+    def _check_resource_controls(self):
+        """Validate the resource controls of the backup"""
+        for rec in self:
+            if not 0 <= rec.cpu_priority <= 19:
+                raise ValidationError(_(
+                    "CPU Niceness must be between 0 and 19."))
+            if rec.bandwidth_limit < 0 or rec.max_db_load < 0:
+                raise ValidationError(_(
+                    "Bandwidth Limit and Max Active Queries cannot be"
+                    " negative."))
+
+    @api.constrains('backup_destination', 'stream_upload')
+    def _check_stream_upload(self):
+        """OneDrive upload sessions need the size of the file up front"""
+        for rec in self:
+            if rec.stream_upload and rec.backup_destination == 'onedrive':
+                raise ValidationError(_(
+                    "Streaming Upload is not supported with OneDrive."))
+
+    @api.constrains('backup_mode', 'wal_archive_dir')
+    def _check_wal_archive_dir(self):
+        """Validate the WAL archive folder of the point-in-time recovery"""
+        for rec in self:
+            if rec.backup_mode == 'pitr' and not rec.wal_archive_dir:
+                raise ValidationError(_(
+                    "Point-in-Time Recovery needs the WAL Archive Folder."))
+
+    @api.constrains('exclude_table_data')
+    def _check_exclude_table_data(self):
+        """Validate the patterns of the tables whose data is excluded"""
+        for rec in self:
+            for pattern in (rec.exclude_table_data or '').split():
+                if not TABLE_PATTERN.match(pattern):
+                    raise ValidationError(_(
+                        "%(pattern)s is not a valid table name or pattern.",
+                        pattern=pattern))
+
+    @api.constrains('ftp_block_size')
+    def _check_ftp_block_size(self):
+        """Validate the size of the FTP transfer blocks"""
+        for rec in self:
+            if rec.ftp_block_size < 1:
+                raise ValidationError(_(
+                    "FTP Block Size must be at least 1 KiB."))
+
+    @api.constrains('onedrive_chunk_size')
+    def _check_onedrive_chunk_size(self):
+        """Validate the size of the Onedrive upload chunks"""
+        for rec in self:
+            if rec.onedrive_chunk_size % ONEDRIVE_CHUNK_ALIGNMENT or \
+                    not 0 < rec.onedrive_chunk_size <= ONEDRIVE_MAX_CHUNK_SIZE:
+                raise ValidationError(_(
+                    "Onedrive Chunk Size must be a multiple of %(alignment)s"
+                    " KiB up to %(max)s KiB.",
+                    alignment=ONEDRIVE_CHUNK_ALIGNMENT,
+                    max=ONEDRIVE_MAX_CHUNK_SIZE))
+
+    @api.constrains('compression', 'compression_level',
+                    'compression_threads')
+    def _check_compression(self):
+        """Validate the compression codec and its settings"""
+        for rec in self:
+            compression = rec._get_compression()
+            if not compression:
+                continue
+            if not is_codec_available(compression):
+                raise ValidationError(_(
+                    "The python library of the %s compression is not"
+                    " installed.", compression))
+            min_level, max_level, _default = COMPRESSION_LEVELS[compression]
+            if not min_level <= rec.compression_level <= max_level:
+                raise ValidationError(_(
+                    "The compression level must be between %(min)s and"
+                    " %(max)s.", min=min_level, max=max_level))
+            if rec.compression_threads < 0:
+                raise ValidationError(_(
+                    "Compression Threads cannot be negative."))
+
+    @api.onchange('compression')
+    def _onchange_compression(self):
+        """Use the default level of the selected codec"""
+        if self._get_compression():
+            self.compression_level = COMPRESSION_LEVELS[self.compression][2]
+
     @api.constrains('db_name')
     def _check_db_credentials(self):
         """Validate entered database name and master password"""
@@ -550,7 +850,8 @@ class DbBackupConfigure(models.Model):
                 client.close()
         elif self.backup_destination == 'ftp':
             try:
-                ftp_server = ftplib.FTP()
+                ftp_server = ftplib.FTP_TLS() if self.ftp_use_tls \
+                    else ftplib.FTP()
                 ftp_server.connect(self.ftp_host, int(self.ftp_port))
                 ftp_server.login(self.ftp_user, self.ftp_password)
                 ftp_server.quit()
@@ -567,6 +868,13 @@ class DbBackupConfigure(models.Model):
             }
         }
 
+    def write(self, vals):
+        """Reset the index of the uploaded filestore files when the backups
+        are sent to another location"""
+        if any(field in vals for field in DESTINATION_LOCATION_FIELDS):
+            self.filestore_blob_ids.unlink()
+        return super().write(vals)
+
     @api.onchange('backup_destination')
     def _onchange_back_up_local(self):
         """
@@ -578,502 +886,1018 @@ class DbBackupConfigure(models.Model):
         if self.backup_destination == 'local':
             self.hide_active = True
 
+    def _get_backup_destination(self, session=None):
+        """Return the BackupDestination storing the backups of this
+        configuration, the access tokens are refreshed if expired.
+
+        :param session: requests.Session of the backup run, reused by the
+            HTTP based destinations
+        """
+        self.ensure_one()
+        if self.backup_destination == 'google_drive' and \
+                self.gdrive_token_validity <= fields.Datetime.now():
+            self.generate_gdrive_refresh_token(session)
+        elif self.backup_destination == 'onedrive' and \
+                self.onedrive_token_validity <= fields.Datetime.now():
+            self.generate_onedrive_refresh_token(session)
+        return BACKUP_DESTINATIONS[self.backup_destination](self, session)
+
+    def _get_backup_prefix(self):
+        """Return the prefix of the names of the backups generated by this
+        configuration, only those are removed by the retention of old
+        backups"""
+        return f'{self.db_name}_'
+
+    def _get_backup_extension(self):
+        """Return the file extension of the backups generated by this
+        configuration. Directory format dumps are packaged as tar archives
+        and the extension of the compression codec is appended."""
+        extension = 'base.tar' if self.backup_mode == 'pitr' else \
+            BACKUP_EXTENSIONS.get(self.backup_format, self.backup_format)
+        compression = self._get_compression()
+        if compression:
+            extension += '.' + COMPRESSION_EXTENSIONS[compression]
+        return extension
+
+    def _get_compression(self):
+        """Return the compression codec applied to the backups, if any"""
+        return self.compression if self.compression != 'none' else False
+
+    def _reconcile_backup_history(self):
+        """Compare the catalog of the backups with the files found at the
+        destinations. Backups missing from the catalog, such as the ones
+        taken before it existed, are added to it so that they are removed
+        in time, and the entries whose file is gone are marked missing."""
+        history = self.env['db.backup.history']
+        with new_http_session() as session:
+            for rec in self.search([]):
+                try:
+                    with rec._get_backup_destination(session) as destination:
+                        files = {
+                            file.name: file
+                            for file in destination.list_files()
+                            if file.name.startswith(rec._get_backup_prefix())
+                        }
+                except Exception as e:
+                    _logger.warning('Unable to list the backups of %s: %s',
+                                    rec.name, e)
+                    continue
+                entries = history.search([
+                    ('backup_config_id', '=', rec.id),
+                    ('backup_destination', '=', destination.name),
+                    ('location', '=', destination.location),
+                    ('state', 'in', ['done', 'missing']),
+                    ('file_type', '=', 'backup'),
+                ])
+                entries.filtered(
+                    lambda entry: entry.state == 'done'
+                    and entry.name not in files).write({'state': 'missing'})
+                entries.filtered(
+                    lambda entry: entry.state == 'missing'
+                    and entry.name in files).write({'state': 'done'})
+                known = set(entries.mapped('name'))
+                history.create([{
+                    'backup_config_id': rec.id,
+                    'name': file.name,
+                    'db_name': rec.db_name,
+                    'backup_destination': destination.name,
+                    'location': destination.location,
+                    'file_size': file.size,
+                    'end_time': file.modified,
+                    'state': 'done',
+                } for file in files.values() if file.name not in known])
+
+    def _ship_wal_segments(self):
+        """Upload the WAL segments archived by PostgreSQL into the WAL
+        archive folder of the point-in-time recovery configurations, then
+        remove them from the folder. A segment is only removed once every
+        configuration archiving to the folder has stored it. The segments
+        not needed anymore by the base backups kept are pruned afterwards."""
+        folders = {}
+        for rec in self.search([('backup_mode', '=', 'pitr')]):
+            folders[rec.wal_archive_dir] = folders.get(
+                rec.wal_archive_dir, self.browse()) | rec
+        with new_http_session() as session:
+            for folder, records in folders.items():
+                try:
+                    names = list_wal_files(folder)
+                except OSError as e:
+                    _logger.error('Unable to read the WAL archive folder'
+                                  ' %s: %s', folder, e)
+                    continue
+                shipped = set(names)
+                for rec in records:
+                    stored = []
+                    try:
+                        with rec._get_backup_destination(session) \
+                                as destination:
+                            for name in names:
+                                start_time = fields.Datetime.now()
+                                path = os.path.join(folder, name)
+                                destination.upload_file(
+                                    path, f'{WAL_FOLDER}/{name}')
+                                rec._create_backup_history(
+                                    destination, f'{WAL_FOLDER}/{name}', {
+                                        'start_time': start_time,
+                                        'end_time': fields.Datetime.now(),
+                                        'file_size': os.path.getsize(path),
+                                        'file_type': 'wal',
+                                    })
+                                stored.append(name)
+                            rec._prune_wal_segments(destination)
+                    except Exception as e:
+                        _logger.error('Unable to ship the WAL segments of'
+                                      ' %s: %s', rec.name, e, exc_info=True)
+                        shipped &= set(stored)
+                # The segments are recorded before leaving the folder
+                self.env.cr.commit()
+                for name in shipped:
+                    os.remove(os.path.join(folder, name))
+
+    def _prune_wal_segments(self, destination):
+        """Remove from `destination` the WAL segments older than the first
+        segment needed by the oldest base backup kept, like
+        pg_archivecleanup. The timeline history files are kept."""
+        self.ensure_one()
+        history = self.env['db.backup.history']
+        domain = [
+            ('backup_config_id', '=', self.id),
+            ('backup_destination', '=', destination.name),
+            ('location', '=', destination.location),
+            ('state', '=', 'done'),
+        ]
+        base = history.search(domain + [
+            ('file_type', '=', 'backup'), ('wal_segment', '!=', False),
+        ], order='end_time, id', limit=1)
+        if not base:
+            return
+        expired = history.search(domain + [
+            ('file_type', '=', 'wal')]).filtered(
+            lambda entry: not is_wal_needed(entry.name.rsplit('/', 1)[-1],
+                                            base.wal_segment))
+        if expired:
+            destination.delete_backups(expired.mapped('name'))
+            expired.write({'state': 'deleted'})
+
+    def _get_current_wal_segment(self, cr):
+        """Return the name of the WAL segment being written by the cluster
+        of cursor `cr`. The base backup taken next starts at or after it."""
+        cr.execute('SELECT pg_walfile_name(pg_current_wal_lsn())')
+        return cr.fetchone()[0]
+
+    def _restore_pitr(self, target_time, pgdata):
+        """Prepare the recovery of the PostgreSQL cluster as it was at
+        `target_time` (UTC) into the empty folder `pgdata`: the last base
+        backup taken before `target_time` is extracted and the WAL segments
+        following it are downloaded into the WAL_FOLDER of `pgdata`, which
+        PostgreSQL replays up to the target when started, e.g. from
+        odoo-bin shell::
+
+            env['db.backup.configure'].browse(1)._restore_pitr(
+                '2024-06-01 09:30:00', '/var/lib/postgresql/restore')
+
+        then, as the owner of the cluster, ``pg_ctl -D <pgdata> start``.
+        The filestore is not part of the base backup.
+
+        :return: the history entry of the base backup used
+        """
+        self.ensure_one()
+        target_time = fields.Datetime.to_datetime(target_time)
+        history = self.env['db.backup.history']
+        if os.path.isdir(pgdata) and os.listdir(pgdata):
+            raise UserError(_("The folder %(folder)s is not empty.",
+                              folder=pgdata))
+        with self._get_backup_destination() as destination:
+            domain = [
+                ('backup_config_id', '=', self.id),
+                ('backup_destination', '=', destination.name),
+                ('location', '=', destination.location),
+                ('state', '=', 'done'),
+            ]
+            base = history.search(domain + [
+                ('file_type', '=', 'backup'), ('wal_segment', '!=', False),
+                ('end_time', '<=', target_time),
+            ], order='end_time desc, id desc', limit=1)
+            if not base:
+                raise UserError(_("No base backup was taken before %(time)s.",
+                                  time=target_time))
+            _logger.info('Restoring base backup %s into %s', base.name,
+                         pgdata)
+            codec = get_filename_codec(base.name)
+            with destination.open_read(base.name) as download, \
+                    (open_decompressor(download, codec) if codec
+                     else nullcontext(download)) as archive:
+                extract_base_backup(archive, pgdata)
+            wal_dir = os.path.join(pgdata, WAL_FOLDER)
+            os.makedirs(wal_dir, mode=0o700)
+            for entry in history.search(domain + [('file_type', '=', 'wal')]):
+                name = entry.name.rsplit('/', 1)[-1]
+                if is_wal_needed(name, base.wal_segment):
+                    destination.download_file(entry.name,
+                                              os.path.join(wal_dir, name))
+        write_recovery_config(pgdata, wal_dir, target_time)
+        return base
+
+    def _verify_backups(self):
+        """Check that the last backup of the configurations verifying their
+        restores can be restored, once per backup. Each configuration is
+        checked on its own and committed, so that a configuration whose
+        destination can not be reached, e.g. with an expired token, does
+        not stop the checks of the others. The HTTP session is shared by
+        the checks."""
+        history = self.env['db.backup.history']
+        with new_http_session() as session:
+            for rec in self.search([('verify_restore', '=', True),
+                                    ('backup_mode', '=', 'dump')]):
+                try:
+                    destination = rec._get_backup_destination(session)
+                    entry = history.search([
+                        ('backup_config_id', '=', rec.id),
+                        ('backup_destination', '=', destination.name),
+                        ('location', '=', destination.location),
+                        ('state', '=', 'done'),
+                        ('file_type', '=', 'backup'),
+                        ('name', 'not like', '%.filestore.json'),
+                    ], limit=1)
+                    if entry and not entry.verify_state:
+                        rec._verify_restore(destination, entry)
+                    self.env.cr.commit()
+                except Exception as e:
+                    _logger.error('Restore check of %s failed: %s',
+                                  rec.name, e, exc_info=True)
+                    self.env.cr.rollback()
+
+    def _verify_restore(self, destination, entry):
+        """Restore the backup of the catalog entry `entry` from `destination`
+        into a scratch database, with restore_backup() like the restore
+        jobs: streamed and decompressed on the fly, with `restore_jobs`
+        parallel pg_restore jobs (psql for the zip format). The content is
+        checked, then the database is dropped. The outcome and the restore
+        duration, download included, are recorded on the entry."""
+        self.ensure_one()
+        scratch = f'{self.db_name[:40]}_verify_{uuid.uuid4().hex[:8]}'
+        codec = get_filename_codec(entry.name)
+        name = entry.name[:-len(COMPRESSION_EXTENSIONS[codec]) - 1] \
+            if codec else entry.name
+        values = {'verify_time': fields.Datetime.now()}
+        try:
+            db._create_empty_database(scratch)
+            try:
+                restore_started = time.monotonic()
+                with destination, \
+                        destination.open_read(entry.name) as download, \
+                        (open_decompressor(download, codec) if codec
+                         else nullcontext(download)) as source:
+                    manifest = restore_backup(
+                        source, name, scratch, exec_pg_environ(),
+                        find_pg_tool, self.restore_jobs)
+                values['restore_duration'] = \
+                    time.monotonic() - restore_started
+                values['verify_details'] = \
+                    self._check_restored_database(scratch, manifest)
+            finally:
+                db.exp_drop(scratch)
+            values['verify_state'] = 'verified'
+        except Exception as e:
+            _logger.error('Restore check of %s failed: %s', entry.name, e,
+                          exc_info=True)
+            values.update(verify_state='failed', verify_error=str(e))
+        entry.write(values)
+
+    def _check_restored_database(self, db_name, manifest):
+        """Count the rows of the VERIFY_TABLES of the restored database
+        `db_name` and compare its installed modules with the `manifest` of
+        the backup. A UserError is raised when the database is incomplete.
+
+        :return: the counts, as text
+        """
+        with odoo.sql_db.db_connect(db_name).cursor() as cr:
+            counts = {}
+            for table in VERIFY_TABLES:
+                cr.execute(SQL('SELECT count(*) FROM %s',
+                               SQL.identifier(table)))
+                counts[table] = cr.fetchone()[0]
+            cr.execute("""SELECT name, latest_version FROM ir_module_module
+                          WHERE state = 'installed'""")
+            modules = dict(cr.fetchall())
+        empty = [table for table in VERIFY_REQUIRED_TABLES
+                 if not counts[table]]
+        if empty:
+            raise UserError(_("The restored database has no rows in "
+                              "%(tables)s.", tables=', '.join(empty)))
+        expected = manifest.get('modules')
+        if expected and expected != modules:
+            different = sorted(set(expected.items()) ^ set(modules.items()))
+            raise UserError(_(
+                "The modules of the restored database differ from the "
+                "manifest: %(modules)s",
+                modules=', '.join(sorted({name for name, _version
+                                          in different}))))
+        return '\n'.join([f'{table}: {count}'
+                          for table, count in counts.items()] +
+                         [f'installed modules: {len(modules)}'])
+
+    def _check_restore(self, entry, db_name):
+        """Check that the backup of the catalog entry `entry` can be
+        restored as the new database `db_name`, before the restore is
+        queued and again when it runs"""
+        self.ensure_one()
+        db.check_super(self.master_pwd)
+        if entry.file_type != 'backup' or entry.wal_segment \
+                or entry.name.endswith('.filestore.json'):
+            raise UserError(_("%(name)s is not a database backup.",
+                              name=entry.name))
+        if db_name in db.list_dbs(True):
+            raise UserError(_("The database %(name)s already exists.",
+                              name=db_name))
+
+    def _restore_backup(self, entry, db_name, neutralize=False,
+                        session=None):
+        """Restore the backup of the catalog entry `entry` as the new
+        database `db_name`: the backup is streamed from the destination,
+        decompressed on the fly and restored by restore_backup(), with
+        `restore_jobs` parallel pg_restore jobs for the Dump and Directory
+        formats, while the files of an incremental filestore
+        backup are downloaded by RESTORE_FILESTORE_WORKERS threads. The
+        restore is run by a restore job, outside of the HTTP workers, and a
+        database left incomplete is dropped.
+
+        :param neutralize: neutralize the restored database, like the
+            database manager does for the copies of a production database
+        """
+        self._check_restore(entry, db_name)
+        codec = get_filename_codec(entry.name)
+        name = entry.name[:-len(COMPRESSION_EXTENSIONS[codec]) - 1] \
+            if codec else entry.name
+        filestore = odoo.tools.config.filestore(db_name)
+        _logger.info('Restoring backup %s as database %s', entry.name,
+                     db_name)
+        db._create_empty_database(db_name)
+        try:
+            self._report_backup_progress('restore')
+            with nullcontext(session) if session else new_http_session() \
+                    as session, ThreadPoolExecutor(
+                        max_workers=RESTORE_FILESTORE_WORKERS) as executor:
+                futures = self._restore_filestore_blobs(
+                    entry, filestore, executor, session)
+                with self._get_backup_destination(session) as destination, \
+                        destination.open_read(entry.name) as download, \
+                        (open_decompressor(download, codec) if codec
+                         else nullcontext(download)) as source:
+                    restore_backup(source, name, db_name, exec_pg_environ(),
+                                   find_pg_tool, self.restore_jobs,
+                                   filestore)
+                for future in futures:
+                    future.result()
+            registry = odoo.modules.registry.Registry.new(db_name)
+            with registry.cursor() as cr:
+                # The restored database is a copy with an identity and
+                # secrets of its own, like the copies of the database manager
+                env = api.Environment(cr, odoo.SUPERUSER_ID, {})
+                env['ir.config_parameter'].init(force=True)
+                if neutralize:
+                    neutralize_database(cr)
+        except Exception:
+            db.exp_drop(db_name)
+            raise
+        _logger.info('Backup %s restored as database %s', entry.name,
+                     db_name)
+
+    def _restore_filestore_blobs(self, entry, filestore, executor, session):
+        """Download the files listed by the incremental filestore manifest
+        of the backup of `entry`, if any, into `filestore`. The files are
+        split between the threads of `executor`, each with a connection to
+        the destination of its own.
+
+        :return: the futures of the downloads
+        """
+        stamp = entry.name[len(entry.db_name) + 1:][:19]
+        manifest_entry = self.env['db.backup.history'].search([
+            ('backup_config_id', '=', self.id),
+            ('backup_destination', '=', entry.backup_destination),
+            ('location', '=', entry.location),
+            ('name', '=', f'{entry.db_name}_{stamp}.filestore.json'),
+            ('state', '=', 'done'),
+        ], limit=1)
+        if not manifest_entry:
+            return []
+        with self._get_backup_destination(session) as destination, \
+                destination.open_read(manifest_entry.name) as file:
+            manifest = json.load(file)
+        names = sorted(manifest['files'])
+        return [
+            executor.submit(self._download_filestore_files, destination,
+                            manifest['folder'],
+                            names[index::RESTORE_FILESTORE_WORKERS],
+                            filestore)
+            for index, destination in enumerate(
+                self._get_backup_destination(session)
+                for _index in range(RESTORE_FILESTORE_WORKERS))
+        ]
+
+    def _download_filestore_files(self, destination, folder, names,
+                                  filestore):
+        """Download the files `names` of `folder` of `destination` into
+        `filestore`, run in a thread: the ORM is not used"""
+        with destination:
+            for name in names:
+                destination.download_file(
+                    f'{folder}/{name}', filestore_path(filestore, name))
+
     def _schedule_auto_backup(self, frequency):
         """Function for generating and storing backup.
            Database backup for all the active records in backup configuration
-           model will be created."""
+           model will be created. The configurations producing the same
+           backup are grouped so that each database is dumped only once.
+           Every group is queued as a backup job. When the system parameter
+           `auto_database_backup.detached_runner` is set, the jobs are left to
+           the backup runner process, otherwise they are run here."""
         records = self.search([('backup_frequency', '=', frequency)])
+        jobs = self.env['db.backup.job'].create([{
+            'backup_config_ids': [fields.Command.set(group.ids)],
+            'frequency': frequency,
+        } for group in records._group_by_dump()])
+        self.env.cr.commit()
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        if get_param('auto_database_backup.detached_runner'):
+            return
+        limits = self._get_backup_limits()
+        max_workers = int(get_param('auto_database_backup.max_workers', 4))
+        with new_http_session() as session:
+            if max_workers <= 1 or len(jobs) <= 1:
+                for job in jobs:
+                    job._start()._run(limits, session)
+                return
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for job in jobs:
+                    executor.submit(self._run_backup_job_in_new_cursor,
+                                    job.id, limits, session)
+
+    def _run_backup_job_in_new_cursor(self, job_id, limits, session):
+        """Run a backup job with a cursor of its own, for the worker threads
+        of _schedule_auto_backup and of the backup runner"""
+        try:
+            with self.env.registry.cursor() as cr:
+                job = self.env(cr=cr)['db.backup.job'].browse(job_id)
+                job._start()._run(limits, session)
+        except Exception as e:
+            _logger.error('Backup job %s failed: %s', job_id, e,
+                          exc_info=True)
+
+    def _get_backup_limits(self):
+        """Return the BackupLimits of a backup run, read from the system
+        parameters `auto_database_backup.max_dumps` (concurrent pg_dump,
+        2 by default) and `auto_database_backup.max_uploads_<destination>`
+        (concurrent uploads per destination type, unlimited by default)"""
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        return BackupLimits(
+            max_dumps=int(get_param('auto_database_backup.max_dumps', 2)),
+            max_uploads={
+                destination: int(get_param(
+                    f'auto_database_backup.max_uploads_{destination}', 0))
+                for destination, _label
+                in self._fields['backup_destination'].selection
+            })
+
+    def _group_by_dump(self):
+        """Split the configurations into groups of configurations producing
+        the same backup file, in order to dump the database once per group"""
+        groups = {}
+        for rec in self:
+            key = (rec.db_name, rec.backup_mode, rec.backup_format,
+                   rec.compression,
+                   rec.compression_level, rec.incremental_filestore,
+                   rec.cpu_priority, rec.io_priority, rec.max_db_load,
+                   tuple((rec.exclude_table_data or '').split()),
+                   rec.exclude_transient_data)
+            groups[key] = groups.get(key, self.browse()) | rec
+        return list(groups.values())
+
+    def _backup_database(self, limits=None, session=None):
+        """Dump the database of the configurations once and upload the backup
+        to the destination of every configuration, concurrently. A single
+        configuration with streaming upload receives the dump directly,
+        otherwise the dump is written to a temporary file first. The files
+        of the incremental filestore are uploaded after the dump, once the
+        snapshot of the database is released. Every file written is recorded
+        in the catalog of the backups (db.backup.history), which tells the
+        old backups to remove without listing the destination.
+
+        :param limits: BackupLimits bounding the concurrent dumps and uploads
+        :param session: requests.Session shared by the HTTP requests of the
+            backup run
+        :return: dictionary of the exception of each configuration whose
+            backup failed
+        """
+        limits = limits or BackupLimits()
         mail_template_success = self.env.ref(
             'auto_database_backup.mail_template_data_db_backup_successful')
         mail_template_failed = self.env.ref(
             'auto_database_backup.mail_template_data_db_backup_failed')
-        for rec in records:
-            backup_time = fields.datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
-            backup_filename = f"{rec.db_name}_{backup_time}.{rec.backup_format}"
-            rec.backup_filename = backup_filename
-            # Local backup
-            if rec.backup_destination == 'local':
+        first = self[0]
+        backup_time = fields.datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")
+        backup_filename = f"{first.db_name}_{backup_time}.{first._get_backup_extension()}"
+        self.backup_filename = backup_filename
+        errors = {}
+        start_time = fields.Datetime.now()
+        started = time.monotonic()
+        first._wait_for_db_load()
+        destinations = {}
+        for rec in self:
+            try:
+                destination = rec._get_backup_destination(session)
+                destinations[rec] = (destination,
+                                     rec._get_expired_backups(destination))
+            except Exception as e:
+                errors[rec] = e
+        # Outcome and metrics of the backup for each destination, filled by
+        # the upload threads and recorded in the catalog once they are done
+        results = {rec: {'start_time': start_time} for rec in destinations}
+        # Configuration receiving the dump while it is generated
+        streamed = next(iter(destinations)) if len(destinations) == 1 and \
+            next(iter(destinations)).stream_upload else None
+        with tempfile.NamedTemporaryFile(
+                suffix='.%s' % first._get_backup_extension()) \
+                if destinations and not streamed else nullcontext() as temp:
+            filestore_files = None
+            if destinations:
+                self._report_backup_progress('dump')
                 try:
-                    if not os.path.isdir(rec.backup_path):
-                        os.makedirs(rec.backup_path)
-                    backup_file = os.path.join(rec.backup_path,
-                                               backup_filename)
-                    f = open(backup_file, "wb")
-                    self.dump_data(rec.db_name, f, rec.backup_format, rec.backup_frequency)
-                    f.close()
-                    # Remove older backups
-                    if rec.auto_remove:
-                        for filename in os.listdir(rec.backup_path):
-                            file = os.path.join(rec.backup_path, filename)
-                            create_time = fields.datetime.fromtimestamp(
-                                os.path.getctime(file))
-                            backup_duration = fields.datetime.utcnow() - create_time
-                            if backup_duration.days >= rec.days_to_remove:
-                                os.remove(file)
-                    if rec.notify_user:
-                        mail_template_success.send_mail(rec.id, force_send=True)
+                    # The dump, its manifest and the list of the filestore
+                    # files are read from the same snapshot of the database,
+                    # which is held for the dump only: its transaction keeps
+                    # vacuum from removing the rows deleted meanwhile
+                    with limits.dump(), \
+                            DatabaseSnapshot(first.db_name) as snapshot:
+                        if self.filtered('incremental_filestore'):
+                            filestore_files = snapshot.filestore_files()
+                        wal_segment = first._get_current_wal_segment(
+                            snapshot.cr) if first.backup_mode == 'pitr' \
+                            else None
+                        for result in results.values():
+                            result['wal_segment'] = wal_segment
+                        if streamed:
+                            streamed._stream_backup(
+                                destinations[streamed][0], backup_filename,
+                                limits, snapshot, results[streamed])
+                            results[streamed].update(
+                                end_time=fields.Datetime.now(),
+                                duration=time.monotonic() - started)
+                        else:
+                            checksum = ChecksumWriter(temp)
+                            stats = {}
+                            dump_started = time.monotonic()
+                            raw_size = first.dump_data(
+                                first.db_name, checksum, first.backup_format,
+                                first.backup_frequency, snapshot, stats)
+                            dump_duration = time.monotonic() - dump_started
+                            temp.flush()
+                            for result in results.values():
+                                result.update(stats, file_size=checksum.size,
+                                              raw_size=raw_size or
+                                              checksum.size,
+                                              dump_duration=dump_duration,
+                                              checksum=checksum.hexdigest())
                 except Exception as e:
-                    rec.generated_exception = e
-                    _logger.info('FTP Exception: %s', e)
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-            # FTP backup
-            elif rec.backup_destination == 'ftp':
+                    errors.update(dict.fromkeys(destinations, e))
+            # The filestore files are uploaded once the snapshot is released
+            incremental = self.filtered(
+                lambda rec: rec.incremental_filestore and rec in destinations
+                and rec not in errors)
+            if incremental:
+                self._report_backup_progress('filestore')
+            for rec in incremental:
+                filestore_started = time.monotonic()
                 try:
-                    ftp_server = ftplib.FTP()
-                    ftp_server.connect(rec.ftp_host, int(rec.ftp_port))
-                    ftp_server.login(rec.ftp_user, rec.ftp_password)
-                    ftp_server.encoding = "utf-8"
-                    temp = tempfile.NamedTemporaryFile(
-                        suffix='.%s' % rec.backup_format)
-                    try:
-                        ftp_server.cwd(rec.ftp_path)
-                    except ftplib.error_perm:
-                        ftp_server.mkd(rec.ftp_path)
-                        ftp_server.cwd(rec.ftp_path)
-                    with open(temp.name, "wb+") as tmp:
-                        self.dump_data(rec.db_name, tmp,
-                                                rec.backup_format, rec.backup_frequency)
-                    ftp_server.storbinary('STOR %s' % backup_filename,
-                                          open(temp.name, "rb"))
-                    if rec.auto_remove:
-                        files = ftp_server.nlst()
-                        for file in files:
-                            create_time = fields.datetime.strptime(
-                                ftp_server.sendcmd('MDTM ' + file)[4:],
-                                "%Y%m%d%H%M%S")
-                            diff_days = (
-                                    fields.datetime.now() - create_time).days
-                            if diff_days >= rec.days_to_remove:
-                                ftp_server.delete(file)
-                    ftp_server.quit()
-                    if rec.notify_user:
-                        mail_template_success.send_mail(rec.id,
-                                                        force_send=True)
+                    rec._backup_filestore_blobs(
+                        f"{rec.db_name}_{backup_time}.filestore.json",
+                        filestore_files, session)
                 except Exception as e:
-                    rec.generated_exception = e
-                    _logger.info('FTP Exception: %s', e)
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-            # SFTP backup
-            elif rec.backup_destination == 'sftp':
-                client = paramiko.SSHClient()
-                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                try:
-                    client.connect(hostname=rec.sftp_host,
-                                   username=rec.sftp_user,
-                                   password=rec.sftp_password,
-                                   port=rec.sftp_port)
-                    sftp = client.open_sftp()
-                    temp = tempfile.NamedTemporaryFile(
-                        suffix='.%s' % rec.backup_format)
-                    with open(temp.name, "wb+") as tmp:
-                        self.dump_data(rec.db_name, tmp, rec.backup_format, rec.backup_frequency)
+                    errors[rec] = e
+                results[rec]['filestore_duration'] = \
+                    time.monotonic() - filestore_started
+            uploads = {rec: destinations[rec] for rec in destinations
+                       if rec not in errors}
+            if streamed in uploads:
+                destination, expired = destinations[streamed]
+                if expired:
                     try:
-                        sftp.chdir(rec.sftp_path)
-                    except IOError as e:
-                        if e.errno == errno.ENOENT:
-                            sftp.mkdir(rec.sftp_path)
-                            sftp.chdir(rec.sftp_path)
-                    sftp.put(temp.name, backup_filename)
-                    if rec.auto_remove:
-                        files = sftp.listdir()
-                        expired = list(filter(
-                            lambda fl: (fields.datetime.now()
-                                        - fields.datetime.fromtimestamp(
-                                        sftp.stat(fl).st_mtime)).days >=
-                                       rec.days_to_remove, files))
-                        for file in expired:
-                            sftp.unlink(file)
-                    sftp.close()
-                    if rec.notify_user:
-                        mail_template_success.send_mail(rec.id,
-                                                        force_send=True)
-                except Exception as e:
-                    rec.generated_exception = e
-                    _logger.info('SFTP Exception: %s', e)
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-                finally:
-                    client.close()
-            # Google Drive backup
-            elif rec.backup_destination == 'google_drive':
-                try:
-                    if rec.gdrive_token_validity <= fields.Datetime.now():
-                        rec.generate_gdrive_refresh_token()
-                    temp = tempfile.NamedTemporaryFile(
-                        suffix='.%s' % rec.backup_format)
-                    with open(temp.name, "wb+") as tmp:
-                        self.dump_data(rec.db_name, tmp,
-                                                rec.backup_format, rec.backup_frequency)
+                        retention_started = time.monotonic()
+                        with destination:
+                            destination.delete_backups(expired.mapped('name'))
+                        results[streamed].update(
+                            deleted=True,
+                            retention_duration=time.monotonic() -
+                            retention_started)
+                    except Exception as e:
+                        errors[streamed] = e
+            elif uploads:
+                def store_backup(destination, expired, result):
+                    with limits.upload(destination.name), destination:
+                        upload_started = time.monotonic()
+                        destination.upload_file(temp.name, backup_filename)
+                        result.update(end_time=fields.Datetime.now(),
+                                      duration=time.monotonic() - started,
+                                      upload_duration=time.monotonic() -
+                                      upload_started)
+                        if expired:
+                            retention_started = time.monotonic()
+                            destination.delete_backups(expired)
+                            result.update(
+                                deleted=True,
+                                retention_duration=time.monotonic() -
+                                retention_started)
+
+                self._report_backup_progress('upload')
+                with ThreadPoolExecutor(
+                        max_workers=len(uploads)) as executor:
+                    futures = {
+                        rec: executor.submit(
+                            store_backup, destination,
+                            expired.mapped('name'), results[rec])
+                        for rec, (destination, expired) in uploads.items()
+                    }
+                for rec, future in futures.items():
                     try:
-                        headers = {
-                            "Authorization": "Bearer %s" % rec.gdrive_access_token}
-                        para = {
-                            "name": backup_filename,
-                            "parents": [rec.google_drive_folder_key],
-                        }
-                        files = {
-                            'data': ('metadata', json.dumps(para),
-                                     'application/json; charset=UTF-8'),
-                            'file': open(temp.name, "rb")
-                        }
-                        requests.post(
-                            "https://www.googleapis.com/upload/drive/v3/files?uploadType=multipart",
-                            headers=headers,
-                            files=files
-                        )
-                        if rec.auto_remove:
-                            query = "parents = '%s'" % rec.google_drive_folder_key
-                            files_req = requests.get(
-                                "https://www.googleapis.com/drive/v3/files?q=%s" % query,
-                                headers=headers)
-                            for file in files_req.json()['files']:
-                                file_date_req = requests.get(
-                                    "https://www.googleapis.com/drive/v3/files/%s?fields=createdTime" %
-                                    file['id'], headers=headers)
-                                create_time = file_date_req.json()[
-                                                  'createdTime'][
-                                              :19].replace('T', ' ')
-                                diff_days = (
-                                        fields.datetime.now() - fields.datetime.strptime(
-                                    create_time, '%Y-%m-%d %H:%M:%S')).days
-                                if diff_days >= rec.days_to_remove:
-                                    requests.delete(
-                                        "https://www.googleapis.com/drive/v3/files/%s" %
-                                        file['id'], headers=headers)
-                        if rec.notify_user:
-                            mail_template_success.send_mail(rec.id,
-                                                            force_send=True)
+                        future.result()
                     except Exception as e:
+                        errors[rec] = e
+        for rec, (destination, expired) in destinations.items():
+            rec._create_backup_history(destination, backup_filename,
+                                       results[rec], errors.get(rec))
+            if results[rec].get('deleted'):
+                expired.write({'state': 'deleted'})
+                if rec.incremental_filestore:
+                    try:
+                        rec._prune_filestore_blobs(destination)
+                    except Exception as e:
+                        # The files are pruned again by the next removal
+                        _logger.error('Removal of the filestore files of %s'
+                                      ' failed: %s', rec.name, e,
+                                      exc_info=True)
+        for rec in self:
+            if rec in errors:
+                rec.generated_exception = errors[rec]
+                _logger.error('%s backup of %s failed: %s',
+                              rec.backup_destination, rec.db_name,
+                              errors[rec], exc_info=errors[rec])
+                if rec.notify_user:
+                    mail_template_failed.send_mail(rec.id, force_send=True)
+            elif rec.notify_user:
+                mail_template_success.send_mail(rec.id, force_send=True)
+        return errors
 
-                        rec.generated_exception = e
-                        _logger.info('Google Drive Exception: %s', e)
-                        if rec.notify_user:
-                            mail_template_failed.send_mail(rec.id,
-                                                           force_send=True)
-                except Exception:
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-                        raise ValidationError(
-                            'Please check the credentials before activation')
-                    else:
-                        raise ValidationError('Please check connection')
-            # Dropbox backup
-            elif rec.backup_destination == 'dropbox':
-                temp = tempfile.NamedTemporaryFile(
-                    suffix='.%s' % rec.backup_format)
-                with open(temp.name, "wb+") as tmp:
-                    self.dump_data(rec.db_name, tmp,
-                                            rec.backup_format, rec.backup_frequency)
-                try:
-                    dbx = dropbox.Dropbox(
-                        app_key=rec.dropbox_client_key,
-                        app_secret=rec.dropbox_client_secret,
-                        oauth2_refresh_token=rec.dropbox_refresh_token)
-                    dropbox_destination = (rec.dropbox_folder + '/' +
-                                           backup_filename)
-                    dbx.files_upload(temp.read(), dropbox_destination)
-                    if rec.auto_remove:
-                        files = dbx.files_list_folder(rec.dropbox_folder)
-                        file_entries = files.entries
-                        expired_files = list(filter(
-                            lambda fl: (fields.datetime.now() -
-                                        fl.client_modified).days >=
-                                       rec.days_to_remove,
-                            file_entries))
-                        for file in expired_files:
-                            dbx.files_delete_v2(file.path_display)
-                    if rec.notify_user:
-                        mail_template_success.send_mail(rec.id,
-                                                        force_send=True)
-                except Exception as error:
-                    rec.generated_exception = error
-                    _logger.info('Dropbox Exception: %s', error)
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-            # Onedrive Backup
-            elif rec.backup_destination == 'onedrive':
-                try:
-                    if rec.onedrive_token_validity <= fields.Datetime.now():
-                        rec.generate_onedrive_refresh_token()
+    def _stream_backup(self, destination, name, limits, snapshot, result):
+        """Dump the database from the DatabaseSnapshot `snapshot` straight
+        to the file `name` of `destination`, filling `result` with the
+        metrics of the backup"""
+        self.ensure_one()
+        with limits.upload(destination.name), destination:
+            dump_started = time.monotonic()
+            with destination.open_write(name) as upload:
+                checksum = ChecksumWriter(upload)
+                raw_size = self.dump_data(
+                    self.db_name, checksum, self.backup_format,
+                    self.backup_frequency, snapshot, result)
+            # The dump is uploaded while it is generated, both stages take
+            # the same time
+            dump_duration = time.monotonic() - dump_started
+            result.update(dump_duration=dump_duration,
+                          upload_duration=dump_duration,
+                          file_size=checksum.size,
+                          raw_size=raw_size or checksum.size,
+                          checksum=checksum.hexdigest())
 
-                    with tempfile.NamedTemporaryFile(suffix=f'.{rec.backup_format}') as temp:
-                        with open(temp.name, "wb+") as tmp:
-                            self.dump_data(rec.db_name, tmp, rec.backup_format, rec.backup_frequency)
+    def _report_backup_progress(self, stage):
+        """Record the stage reached by the backup job running these
+        configurations, if any. It is committed at once, which also ends the
+        transaction opened so far: no transaction is kept open during the
+        long stages of the backup."""
+        job_id = self.env.context.get('backup_job_id')
+        if job_id:
+            self.env['db.backup.job'].browse(job_id).write({
+                'stage': stage,
+                'heartbeat': fields.Datetime.now(),
+            })
+            self.env.cr.commit()
 
-                        headers = {
-                            'Authorization': f'Bearer {rec.onedrive_access_token}',
-                            'Content-Type': 'application/json'
-                        }
+    def _wait_for_db_load(self):
+        """Wait while more than `max_db_load` queries run on the database,
+        at most DB_LOAD_MAX_WAIT seconds"""
+        self.ensure_one()
+        if not self.max_db_load:
+            return
+        deadline = time.monotonic() + DB_LOAD_MAX_WAIT
+        while True:
+            with odoo.sql_db.db_connect(self.db_name).cursor() as cr:
+                cr.execute("""SELECT count(*) FROM pg_stat_activity
+                              WHERE datname = %s AND state = 'active'
+                              AND pid != pg_backend_pid()""", [self.db_name])
+                load = cr.fetchone()[0]
+            if load <= self.max_db_load:
+                return
+            if time.monotonic() >= deadline:
+                _logger.warning('Database %s still runs %s queries, starting'
+                                ' the backup anyway', self.db_name, load)
+                return
+            _logger.info('Database %s runs %s queries, backup waiting',
+                         self.db_name, load)
+            self._report_backup_progress('waiting')
+            time.sleep(DB_LOAD_CHECK_INTERVAL)
 
-                        upload_session_url = (
-                            f"{MICROSOFT_GRAPH_END_POINT}/v1.0/me/drive/items/"
-                            f"{rec.onedrive_folder_key}:/{backup_filename}:/createUploadSession"
-                        )
-
-                        upload_session = requests.post(upload_session_url, headers=headers)
-                        upload_session.raise_for_status()
-
-                        upload_url = upload_session.json().get('uploadUrl')
-                        if not upload_url:
-                            raise ValueError("Failed to get upload URL from OneDrive")
-
-                        file_size = os.path.getsize(temp.name)
-                        with open(temp.name, 'rb') as f:
-                            headers_upload = {
-                                'Content-Length': str(file_size),
-                                'Content-Range': f'bytes 0-{file_size - 1}/{file_size}'
-                            }
-                            upload_response = requests.put(upload_url, headers=headers_upload, data=f)
-                            upload_response.raise_for_status()
-
-
-                        if rec.auto_remove:
-                            verify_url = (
-                                f"{MICROSOFT_GRAPH_END_POINT}/v1.0/me/drive/items/"
-                                f"{rec.onedrive_folder_key}:/{backup_filename}"
-                            )
-                            verify_response = requests.get(verify_url, headers=headers)
-
-                            if verify_response.status_code == 200:
-                                list_url = (
-                                    f"{MICROSOFT_GRAPH_END_POINT}/v1.0/me/drive/items/"
-                                    f"{rec.onedrive_folder_key}/children"
-                                )
-                                response = requests.get(list_url, headers=headers)
-                                response.raise_for_status()
-
-                                files = response.json().get('value', [])
-                                current_time = fields.datetime.now()
-
-                                for file in files:
-                                    if file['name'] == backup_filename:
-                                        continue
-
-                                    create_time_str = file['createdDateTime'][:19].replace('T', ' ')
-                                    create_time = fields.datetime.strptime(create_time_str, '%Y-%m-%d %H:%M:%S')
-                                    diff_days = (current_time - create_time).days
-
-                                    if diff_days >= rec.days_to_remove:
-                                        delete_url = f"{MICROSOFT_GRAPH_END_POINT}/v1.0/me/drive/items/{file['id']}"
-                                        requests.delete(delete_url, headers=headers).raise_for_status()
-
-                        # Notify user on success
-                        if rec.notify_user:
-                            mail_template_success.send_mail(rec.id, force_send=True)
-
-                except requests.exceptions.RequestException as req_error:
-                    rec.generated_exception = str(req_error)
-                    _logger.error('OneDrive API Error: %s', req_error, exc_info=True)
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-
-                except Exception as error:
-                    rec.generated_exception = str(error)
-                    _logger.error('OneDrive Backup Error: %s', error, exc_info=True)
-                    if rec.notify_user:
-                        mail_template_failed.send_mail(rec.id, force_send=True)
-            elif rec.backup_destination == 'next_cloud':
-                try:
-                    if rec.domain and rec.next_cloud_password and \
-                            rec.next_cloud_user_name:
-                        try:
-                            # Connect to NextCloud using the provided username
-                            # and password
-                            ncx = NextCloud(rec.domain,
-                                            auth=HTTPBasicAuth(
-                                                rec.next_cloud_user_name,
-                                                rec.next_cloud_password))
-                            # Connect to NextCloud again to perform additional
-                            # operations
-                            nc = nextcloud_client.Client(rec.domain)
-                            nc.login(rec.next_cloud_user_name,
-                                     rec.next_cloud_password)
-                            # Get the folder name from the NextCloud folder ID
-                            folder_name = rec.nextcloud_folder_key
-                            # If auto_remove is enabled, remove backup files
-                            # older than specified days
-                            if rec.auto_remove:
-                                folder_path = "/" + folder_name
-                                for item in nc.list(folder_path):
-                                    backup_file_name = item.path.split("/")[-1]
-                                    backup_date_str = \
-                                        backup_file_name.split("_")[1]
-                                    backup_date = fields.datetime.strptime(
-                                        backup_date_str, '%Y-%m-%d').date()
-                                    if (fields.date.today() - backup_date).days \
-                                            >= rec.days_to_remove:
-                                        nc.delete(item.path)
-                            # If notify_user is enabled, send a success email
-                            # notification
-                            if rec.notify_user:
-                                mail_template_success.send_mail(rec.id,
-                                                                force_send=True)
-                        except Exception as error:
-                            rec.generated_exception = error
-                            _logger.info('NextCloud Exception: %s', error)
-                            if rec.notify_user:
-                                # If an exception occurs, send a failed email
-                                # notification
-                                mail_template_failed.send_mail(rec.id,
-                                                               force_send=True)
-                        # Get the list of folders in the root directory of NextCloud
-                        data = ncx.list_folders('/').__dict__
-                        folders = [
-                            [file_name['href'].split('/')[-2],
-                             file_name['file_id']]
-                            for file_name in data['data'] if
-                            file_name['href'].endswith('/')]
-                        # If the folder name is not found in the list of folders,
-                        # create the folder
-                        if folder_name not in [file[0] for file in folders]:
-                            nc.mkdir(folder_name)
-                            # Dump the database to a temporary file
-                            temp = tempfile.NamedTemporaryFile(
-                                suffix='.%s' % rec.backup_format)
-                            with open(temp.name, "wb+") as tmp:
-                                self.dump_data(rec.db_name, tmp,
-                                                        rec.backup_format, rec.backup_frequency)
-                            backup_file_name = temp.name
-                            remote_file_path = f"/{folder_name}/{rec.db_name}_" \
-                                               f"{backup_time}.{rec.backup_format}"
-                            nc.put_file(remote_file_path, backup_file_name)
-                        else:
-                            # Dump the database to a temporary file
-                            temp = tempfile.NamedTemporaryFile(
-                                suffix='.%s' % rec.backup_format)
-                            with open(temp.name, "wb+") as tmp:
-                                self.dump_data(rec.db_name, tmp,
-                                                        rec.backup_format, rec.backup_frequency)
-                            backup_file_name = temp.name
-                            remote_file_path = f"/{folder_name}/{rec.db_name}_" \
-                                               f"{backup_time}.{rec.backup_format}"
-                            nc.put_file(remote_file_path, backup_file_name)
-                except Exception:
-                    raise ValidationError('Please check connection')
-            # Amazon S3 Backup
-            elif rec.backup_destination == 'amazon_s3':
-                if rec.aws_access_key and rec.aws_secret_access_key:
-                    try:
-                        # Create a boto3 client for Amazon S3 with provided
-                        # access key id and secret access key
-                        bo3 = boto3.client(
-                            's3',
-                            aws_access_key_id=rec.aws_access_key,
-                            aws_secret_access_key=rec.aws_secret_access_key)
-                        # If auto_remove is enabled, remove the backups that
-                        # are older than specified days from the S3 bucket
-                        if rec.auto_remove:
-                            folder_path = rec.aws_folder_name
-                            response = bo3.list_objects(
-                                Bucket=rec.bucket_file_name,
-                                Prefix=folder_path)
-                            today = fields.date.today()
-                            for file in response['Contents']:
-                                file_path = file['Key']
-                                last_modified = file['LastModified']
-                                date = last_modified.date()
-                                age_in_days = (today - date).days
-                                if age_in_days >= rec.days_to_remove:
-                                    bo3.delete_object(
-                                        Bucket=rec.bucket_file_name,
-                                        Key=file_path)
-                        # Create a boto3 resource for Amazon S3 with provided
-                        # access key id and secret access key
-                        s3 = boto3.resource(
-                            's3',
-                            aws_access_key_id=rec.aws_access_key,
-                            aws_secret_access_key=rec.aws_secret_access_key)
-                        # Create a folder in the specified bucket, if it
-                        # doesn't already exist
-                        s3.Object(rec.bucket_file_name,
-                                  rec.aws_folder_name + '/').put()
-                        bucket = s3.Bucket(rec.bucket_file_name)
-                        # Get all the prefixes in the bucket
-                        prefixes = set()
-                        for obj in bucket.objects.all():
-                            key = obj.key
-                            if key.endswith('/'):
-                                prefix = key[:-1]  # Remove the trailing slash
-                                prefixes.add(prefix)
-                        # If the specified folder is present in the bucket,
-                        # take a backup of the database and upload it to the
-                        # S3 bucket
-                        if rec.aws_folder_name in prefixes:
-                            temp = tempfile.NamedTemporaryFile(
-                                suffix='.%s' % rec.backup_format)
-                            with open(temp.name, "wb+") as tmp:
-                                self.dump_data(rec.db_name, tmp,
-                                                        rec.backup_format, rec.backup_frequency)
-                            backup_file_name = temp.name
-                            remote_file_path = f"{rec.aws_folder_name}/{rec.db_name}_" \
-                                               f"{backup_time}.{rec.backup_format}"
-                            s3.Object(rec.bucket_file_name,
-                                      remote_file_path).upload_file(
-                                backup_file_name)
-                            # If notify_user is enabled, send an email to the
-                            # user notifying them about the successful backup
-                            if rec.notify_user:
-                                mail_template_success.send_mail(rec.id,
-                                                                force_send=True)
-                    except Exception as error:
-                        # If any error occurs, set the 'generated_exception'
-                        # field to the error message and log the error
-                        rec.generated_exception = error
-                        _logger.info('Amazon S3 Exception: %s', error)
-                        # If notify_user is enabled, email the user
-                        # notifying them about the failed backup
-                        if rec.notify_user:
-                            mail_template_failed.send_mail(rec.id, force_send=True)
-
-    def dump_data(self, db_name, stream, backup_format, backup_frequency):
+    def _get_priority_command(self):
+        """Return the command prefix running a program with the CPU and IO
+        priorities of the configuration"""
+        command = []
+        if self.io_priority in IO_PRIORITY_ARGS:
+            if shutil.which('ionice'):
+                command += ['ionice'] + IO_PRIORITY_ARGS[self.io_priority]
+            else:
+                _logger.warning('ionice not found, pg_dump runs with the'
+                                ' normal IO priority')
+        if self.cpu_priority:
+            if shutil.which('nice'):
+                command += ['nice', '-n', str(self.cpu_priority)]
+            else:
+                _logger.warning('nice not found, pg_dump runs with the normal'
+                                ' CPU priority')
+        return command
+
+    def _get_expired_backups(self, destination):
+        """Return the catalog entries of the backups stored at `destination`
+        for `days_to_remove` days or more, nothing without auto remove. The
+        WAL segments are pruned with their base backup instead."""
+        self.ensure_one()
+        if not self.auto_remove:
+            return self.env['db.backup.history']
+        return self.env['db.backup.history'].search([
+            ('backup_config_id', '=', self.id),
+            ('backup_destination', '=', destination.name),
+            ('location', '=', destination.location),
+            ('state', '=', 'done'),
+            ('file_type', '=', 'backup'),
+            ('end_time', '<=', fields.Datetime.now() - timedelta(
+                days=self.days_to_remove)),
+        ])
+
+    def _create_backup_history(self, destination, name, result, error=None):
+        """Record the file `name` written to `destination` in the catalog.
+        `result` holds the timings, size and checksum of the backup, the
+        file is only stored once the upload has set its `end_time`."""
+        self.ensure_one()
+        return self.env['db.backup.history'].create({
+            'backup_config_id': self.id,
+            'name': name,
+            'db_name': self.db_name,
+            'backup_destination': destination.name,
+            'location': destination.location,
+            'file_size': result.get('file_size'),
+            'checksum': result.get('checksum'),
+            'start_time': result.get('start_time'),
+            'end_time': result.get('end_time') or fields.Datetime.now(),
+            'duration': result.get('duration'),
+            'dump_duration': result.get('dump_duration'),
+            'filestore_duration': result.get('filestore_duration'),
+            'upload_duration': result.get('upload_duration'),
+            'retention_duration': result.get('retention_duration'),
+            'raw_size': result.get('raw_size'),
+            'peak_rss': result.get('peak_rss'),
+            'file_type': result.get('file_type', 'backup'),
+            'wal_segment': result.get('wal_segment'),
+            'state': 'done' if result.get('end_time') else 'failed',
+            'error': str(error) if error and not result.get('end_time')
+            else False,
+        })
+
+    def dump_data(self, db_name, stream, backup_format, backup_frequency,
+                  snapshot=None, stats=None):
         """Dump database `db` into file-like object `stream` if stream is None
-        return a file object with the dump. """
+        return a file object with the dump. Otherwise return the size of the
+        dump before compression, None when it is not compressed. The dump is
+        taken from the DatabaseSnapshot `snapshot`, a new one by default.
+        The peak memory of the dump process is stored in the `stats`
+        dictionary under `peak_rss`."""
         cron_user_id = self.env.ref(f'auto_database_backup.ir_cron_auto_db_backup_{backup_frequency}').user_id.id
         if cron_user_id != self.env.user.id:
             _logger.error(
                 'Unauthorized database operation. Backups should only be available from the cron job.')
             raise ValidationError("Unauthorized database operation. Backups should only be available from the cron job.")
+        if not stream:
+            t = tempfile.TemporaryFile()
+            self.dump_data(db_name, t, backup_format, backup_frequency,
+                           snapshot, stats)
+            t.seek(0)
+            return t
+        if not snapshot:
+            with DatabaseSnapshot(db_name) as snapshot:
+                return self.dump_data(db_name, stream, backup_format,
+                                      backup_frequency, snapshot, stats)
         _logger.info('DUMP DB: %s format %s', db_name, backup_format)
-        cmd = [find_pg_tool('pg_dump'), '--no-owner', db_name]
+        stats = {} if stats is None else stats
+        compression = self._get_compression()
+        if compression:
+            with open_compressor(stream, compression,
+                                 self.compression_level,
+                                 self.compression_threads) as compressed:
+                uncompressed = CountingWriter(compressed)
+                stats['peak_rss'] = self._dump_database(
+                    db_name, uncompressed, backup_format, snapshot)
+            return uncompressed.size
+        stats['peak_rss'] = self._dump_database(db_name, stream,
+                                                backup_format, snapshot)
+
+    def _dump_database(self, db_name, stream, backup_format, snapshot):
+        """Write the backup of `db_name` in `backup_format` into `stream`,
+        as seen by the DatabaseSnapshot `snapshot`. When the backup is
+        compressed by a codec, pg_dump and the zip archive store their data
+        uncompressed. In point-in-time recovery mode, the backup is a base
+        backup of the PostgreSQL cluster instead. Return the peak memory of
+        the dump process, in MiB."""
         env = exec_pg_environ()
+        if self.backup_mode == 'pitr':
+            # Tar archive of the whole cluster on the standard output, with
+            # the WAL needed to make it consistent
+            return self._stream_pg_dump(
+                self._get_priority_command() + basebackup_command(
+                    find_pg_tool('pg_basebackup'), db_name),
+                env, stream, tool='pg_basebackup')
+        cmd = self._get_priority_command() + [
+            find_pg_tool('pg_dump'), '--no-owner',
+            '--snapshot=' + snapshot.snapshot_id, db_name]
+        if self._get_compression() and backup_format != 'zip':
+            cmd.insert(-1, '--compress=0')
+        for pattern in self._get_excluded_table_data(snapshot.cr):
+            cmd.insert(-1, '--exclude-table-data=' + pattern)
         if backup_format == 'zip':
+            return self._write_zip_backup(db_name, cmd, env, stream, snapshot)
+        if backup_format == 'directory':
             with tempfile.TemporaryDirectory() as dump_dir:
-                filestore = odoo.tools.config.filestore(db_name)
-                cmd.insert(-1,'--file=' + os.path.join(dump_dir, 'dump.sql'))
-                subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL,
-                               stderr=subprocess.STDOUT, check=True)
-                if os.path.exists(filestore):
-                    shutil.copytree(filestore,
-                                    os.path.join(dump_dir, 'filestore'))
-                with open(os.path.join(dump_dir, 'manifest.json'), 'w') as fh:
-                    db = odoo.sql_db.db_connect(db_name)
-                    with db.cursor() as cr:
-                        json.dump(self._dump_db_manifest(cr), fh, indent=4)
-                if stream:
-                    odoo.tools.osutil.zip_dir(dump_dir, stream,
-                                              include_dir=False,
-                                              fnct_sort=lambda
-                                                  file_name: file_name != 'dump.sql')
-                else:
-                    t = tempfile.TemporaryFile()
-                    odoo.tools.osutil.zip_dir(dump_dir, t, include_dir=False,
-                                              fnct_sort=lambda
-                                                  file_name: file_name != 'dump.sql')
-                    t.seek(0)
-                    return t
-        else:
-            cmd.insert(-1,'--format=c')
-            process = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE)
-            stdout, _ = process.communicate()
-            if stream:
-                stream.write(stdout)
-            else:
-                return stdout
+                dump_path = os.path.join(dump_dir, 'dump')
+                cmd.insert(-1, '--format=d')
+                cmd.insert(-1, '--jobs=%s' % (self.dump_jobs or 1))
+                cmd.insert(-1, '--file=' + dump_path)
+                peak_rss = self._stream_pg_dump(cmd, env, None)
+                manifest_path = os.path.join(dump_dir, 'manifest.json')
+                with open(manifest_path, 'w') as fh:
+                    json.dump(self._dump_db_manifest(snapshot.cr), fh,
+                              indent=4)
+                with tarfile.open(fileobj=stream, mode='w|') as tar:
+                    tar.add(manifest_path, arcname='manifest.json')
+                    tar.add(dump_path, arcname='dump')
+            return peak_rss
+        cmd.insert(-1, '--format=c')
+        return self._stream_pg_dump(cmd, env, stream)
+
+    def _backup_filestore_blobs(self, manifest_name, files, session=None):
+        """Incremental backup of the filestore. Odoo stores the attachments
+        under the SHA1 of their content, so a file is uploaded once to
+        FILESTORE_BLOB_FOLDER and is never modified afterwards. Only the files
+        missing from the index of uploaded files are sent, followed by a
+        manifest listing every file used by this backup.
+
+        With the removal of old backups, the files referenced by no manifest
+        kept anymore are removed afterwards by _prune_filestore_blobs().
+
+        The files backed up are `files`, the filestore files of the
+        attachments existing in the snapshot of the database the backup was
+        dumped from (see DatabaseSnapshot.filestore_files())."""
+        self.ensure_one()
+        filestore = odoo.tools.config.filestore(self.db_name)
+        blobs = {name: os.path.join(filestore, name) for name in files}
+        self.env.cr.execute("""SELECT name FROM db_backup_blob
+                               WHERE backup_config_id = %s""", [self.id])
+        uploaded = {name for name, in self.env.cr.fetchall()}
+        manifest = {
+            'db_name': self.db_name,
+            'folder': FILESTORE_BLOB_FOLDER,
+            'files': {},
+        }
+        new_blobs = []
+        with self._get_backup_destination(session) as destination:
+            for name, path in sorted(blobs.items()):
+                try:
+                    if name not in uploaded:
+                        destination.upload_file(
+                            path, f'{FILESTORE_BLOB_FOLDER}/{name}')
+                        new_blobs.append(name)
+                    manifest['files'][name] = os.path.getsize(path)
+                except FileNotFoundError:
+                    # Attachment garbage collected during the backup
+                    _logger.warning('Filestore file %s vanished during the'
+                                    ' backup', path)
+            start_time = fields.Datetime.now()
+            data = json.dumps(manifest, indent=4).encode()
+            with destination.open_write(manifest_name, len(data)) as up:
+                checksum = ChecksumWriter(up)
+                checksum.write(data)
+            now = fields.Datetime.now()
+            self._create_backup_history(destination, manifest_name, {
+                'start_time': start_time,
+                'end_time': now,
+                'file_size': checksum.size,
+                'checksum': checksum.hexdigest(),
+            })
+            self.env.cr.execute("""UPDATE db_backup_blob SET last_backup = %s
+                                   WHERE backup_config_id = %s
+                                   AND name = ANY(%s)""",
+                                [now, self.id, list(manifest['files'])])
+            for index in range(0, len(new_blobs), 1000):
+                self.env['db.backup.blob'].create([{
+                    'backup_config_id': self.id,
+                    'name': name,
+                    'file_size': manifest['files'][name],
+                    'last_backup': now,
+                } for name in new_blobs[index:index + 1000]])
+
+    def _prune_filestore_blobs(self, destination):
+        """Remove the files of the incremental filestore backup referenced by
+        no manifest kept at `destination`, once the retention has deleted
+        the expired manifests. The `last_backup` of a file is the time of the
+        last manifest listing it, which is the end time of that manifest:
+        the files older than the oldest manifest kept are not needed
+        anymore."""
+        self.ensure_one()
+        oldest = self.env['db.backup.history'].search([
+            ('backup_config_id', '=', self.id),
+            ('backup_destination', '=', destination.name),
+            ('location', '=', destination.location),
+            ('state', '=', 'done'),
+            ('name', '=like', '%.filestore.json'),
+        ], order='end_time, id', limit=1)
+        if not oldest:
+            return
+        expired = self.env['db.backup.blob'].search([
+            ('backup_config_id', '=', self.id),
+            ('last_backup', '<', oldest.end_time)])
+        if expired:
+            with destination:
+                destination.delete_backups([
+                    f'{FILESTORE_BLOB_FOLDER}/{blob.name}'
+                    for blob in expired])
+            expired.unlink()
+
+    def _write_zip_backup(self, db_name, cmd, env, stream, snapshot):
+        """Write the plain SQL dump, the filestore and the manifest of the
+        database as a ZIP64 archive into `stream`. The pg_dump output and the
+        filestore files are compressed straight into the archive, nothing is
+        copied to a temporary directory. The filestore files are the ones of
+        the attachments existing in the DatabaseSnapshot `snapshot` of the
+        dump. Return the peak memory of pg_dump, in MiB."""
+        filestore = odoo.tools.config.filestore(db_name)
+        compression = zipfile.ZIP_STORED if self._get_compression() \
+            else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(stream, 'w', compression=compression,
+                             allowZip64=True) as zipf:
+            with zipf.open('dump.sql', 'w', force_zip64=True) as dump_file:
+                peak_rss = self._stream_pg_dump(cmd, env, dump_file)
+            # With the incremental backup, the filestore is stored separately
+            for name in ([] if self.incremental_filestore
+                         else snapshot.filestore_files()):
+                path = os.path.join(filestore, name)
+                try:
+                    zipf.write(path, os.path.join('filestore', name))
+                except FileNotFoundError:
+                    # Attachment garbage collected during the backup
+                    _logger.warning('Filestore file %s vanished during'
+                                    ' the backup', path)
+            zipf.writestr('manifest.json',
+                          json.dumps(self._dump_db_manifest(snapshot.cr),
+                                     indent=4))
+        return peak_rss
+
+    def _stream_pg_dump(self, cmd, env, stream, tool='pg_dump',
+                        source=None):
+        """Run pg_dump, or the PostgreSQL tool named `tool`, with
+        run_pg_tool(): its output is copied to `stream` and the readable
+        `source` to its input. A failure is raised as a UserError with the
+        end of the error output of the tool.
+
+        Return the peak resident memory of the process in MiB, None where
+        the platform does not report it."""
+        try:
+            return run_pg_tool(cmd, env, stream, source, tool)
+        except PgToolError as e:
+            _logger.error('%s failed (exit code %s): %s', e.tool,
+                          e.returncode, e.error)
+            raise UserError(_("%(tool)s failed with exit code %(code)s: "
+                              "%(error)s", tool=e.tool, code=e.returncode,
+                              error=e.error))
+
+    def _get_excluded_table_data(self, cr):
+        """Return the pg_dump patterns of the tables whose data is left out
+        of the backup. The transient models are read from the dumped
+        database through its cursor `cr`, they depend on its modules."""
+        self.ensure_one()
+        patterns = (self.exclude_table_data or '').split()
+        if self.exclude_transient_data:
+            cr.execute("SELECT model FROM ir_model WHERE transient"
+                       " ORDER BY model")
+            patterns += [model.replace('.', '_') for model, in cr.fetchall()]
+        return list(dict.fromkeys(patterns))
 
     def _dump_db_manifest(self, cr):
-        """ This function generates a manifest dictionary for database dump."""
+        """ This function generates a manifest dictionary for database dump,
+        with the tables whose data was excluded."""
         pg_version = "%d.%d" % divmod(cr._obj.connection.server_version / 100, 100)
         cr.execute(
             "SELECT name, latest_version FROM ir_module_module WHERE state = 'installed'")
@@ -1086,5 +1910,6 @@ class DbBackupConfigure(models.Model):
             'major_version': odoo.release.major_version,
             'pg_version': pg_version,
             'modules': modules,
+            'excluded_table_data': self._get_excluded_table_data(cr),
         }
         return manifest
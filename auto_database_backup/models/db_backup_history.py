@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+from odoo import api, fields, models
+
+
+class DbBackupHistory(models.Model):
+    """Catalog of the files written to the destinations by the backups. The
+    removal of the old backups is decided from the catalog, so the remote
+    folders never need to be listed, except by the periodic reconciliation
+    of the catalog with the destinations."""
+    _name = 'db.backup.history'
+    _description = 'Database Backup History'
+    _order = 'end_time desc, id desc'
+
+    backup_config_id = fields.Many2one('db.backup.configure',
+                                       string='Backup Configuration',
+                                       required=True, ondelete='cascade',
+                                       index=True,
+                                       help='Backup configuration which'
+                                            ' wrote the file')
+    name = fields.Char(string='File Name', required=True,
+                       help='Name of the file in the backup folder')
+    db_name = fields.Char(string='Database', help='Database backed up')
+    backup_destination = fields.Selection(
+        selection=lambda self: self.env['db.backup.configure']._fields[
+            'backup_destination'].selection,
+        string='Backup Destination', help='Destination of the file')
+    file_type = fields.Selection([
+        ('backup', 'Backup'),
+        ('wal', 'WAL Segment'),
+    ], string='File Type', required=True, default='backup', index=True,
+        help='WAL segments are shipped continuously for the point-in-time'
+             ' recovery, they are removed with the base backups instead of'
+             ' after a number of days')
+    wal_segment = fields.Char(string='First WAL Segment',
+                              help='First WAL segment needed to recover from'
+                                   ' the base backup')
+    location = fields.Char(string='Remote Folder', index=True,
+                           help='Folder of the destination storing the file')
+    file_size = fields.Float(string='Size', digits=(16, 0),
+                             help='Size of the file in bytes')
+    checksum = fields.Char(string='SHA-256',
+                           help='SHA-256 checksum of the file')
+    start_time = fields.Datetime(string='Start Time',
+                                 help='Start of the backup')
+    end_time = fields.Datetime(string='End Time', index=True,
+                               help='End of the upload of the file')
+    duration = fields.Float(string='Duration (s)', aggregator='avg',
+                            help='Time taken by the backup, in seconds')
+    state = fields.Selection([
+        ('done', 'Stored'),
+        ('failed', 'Failed'),
+        ('deleted', 'Deleted'),
+        ('missing', 'Missing'),
+    ], string='Status', required=True, default='done', index=True,
+        help='Stored: the file is at the destination.\n'
+             'Failed: the backup could not be written.\n'
+             'Deleted: the file was removed as an old backup.\n'
+             'Missing: the file was not found at the destination by the'
+             ' reconciliation.')
+    error = fields.Text(string='Error', help='Error of a failed backup')
+    dump_duration = fields.Float(
+        string='Dump Duration (s)', aggregator='avg',
+        help='Time taken to dump the database, including the filestore and'
+             ' the compression. With streaming upload, the dump and the'
+             ' upload run together.')
+    filestore_duration = fields.Float(
+        string='Filestore Duration (s)', aggregator='avg',
+        help='Time taken by the incremental filestore backup')
+    upload_duration = fields.Float(string='Upload Duration (s)',
+                                   aggregator='avg',
+                                   help='Time taken to upload the backup')
+    retention_duration = fields.Float(
+        string='Retention Duration (s)', aggregator='avg',
+        help='Time taken to remove the old backups')
+    raw_size = fields.Float(string='Uncompressed Size', digits=(16, 0),
+                            help='Size of the backup before compression, in'
+                                 ' bytes')
+    compression_ratio = fields.Float(string='Compression Ratio',
+                                     compute='_compute_compression_ratio',
+                                     store=True, aggregator='avg',
+                                     help='Uncompressed size divided by the'
+                                          ' size of the backup')
+    upload_speed = fields.Float(string='Upload Speed (MiB/s)',
+                                compute='_compute_upload_speed', store=True,
+                                aggregator='avg',
+                                help='Average upload throughput')
+    verify_state = fields.Selection([
+        ('verified', 'Verified'),
+        ('failed', 'Failed'),
+    ], string='Restore Check', index=True,
+        help='Outcome of the restore of the backup into a scratch database'
+             ' by the verification scheduled action')
+    verify_time = fields.Datetime(string='Checked On',
+                                  help='Time of the restore check')
+    restore_duration = fields.Float(
+        string='Restore Duration (s)', aggregator='avg',
+        help='Time taken to download and restore the backup into the'
+             ' scratch database, the recovery time of the database')
+    verify_details = fields.Text(string='Restore Check Details',
+                                 help='Rows counted in the key tables of the'
+                                      ' restored database')
+    verify_error = fields.Text(string='Restore Check Error',
+                               help='Why the restore check failed')
+    peak_rss = fields.Float(string='Dump Peak Memory (MiB)',
+                            aggregator='max',
+                            help='Peak resident memory of the pg_dump or'
+                                 ' pg_basebackup process of this backup')
+
+    @api.depends('raw_size', 'file_size')
+    def _compute_compression_ratio(self):
+        """Compute the compression ratio of the backup"""
+        for rec in self:
+            rec.compression_ratio = rec.raw_size / rec.file_size \
+                if rec.raw_size and rec.file_size else 0
+
+    @api.depends('file_size', 'upload_duration')
+    def _compute_upload_speed(self):
+        """Compute the upload throughput in MiB/s"""
+        for rec in self:
+            rec.upload_speed = rec.file_size / rec.upload_duration / 1048576 \
+                if rec.upload_duration else 0
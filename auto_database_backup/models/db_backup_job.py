@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import logging
+import os
+import socket
+from datetime import timedelta
+from odoo import api, fields, models
+from odoo.service import db
+from ..tools.backup_destinations import new_http_session
+
+_logger = logging.getLogger(__name__)
+
+JOB_RETENTION_DAYS = 90
+
+
+class DbBackupJob(models.Model):
+    """Backup of a group of configurations producing the same backup file,
+    queued by the scheduled actions, or restore of a backup, queued by the
+    Restore Backup wizard. The jobs are run by the backup runner (odoo-bin
+    backup_runner), a process of its own, so that no backup runs inside the
+    transaction of a scheduled action and no restore inside an HTTP worker.
+    The runner writes the progress of a job in short transactions."""
+    _name = 'db.backup.job'
+    _description = 'Database Backup Job'
+    _order = 'id desc'
+
+    job_type = fields.Selection([
+        ('backup', 'Backup'),
+        ('restore', 'Restore'),
+    ], string='Type', required=True, default='backup',
+        help='Backup: backup of the configurations.\n'
+             'Restore: restore of a backup as a new database.')
+    backup_config_ids = fields.Many2many('db.backup.configure',
+                                         string='Backup Configurations',
+                                         required=True,
+                                         help='Configurations backed up by'
+                                              ' the job, or storing the'
+                                              ' restored backup')
+    restore_backup_id = fields.Many2one('db.backup.history',
+                                        string='Restored Backup',
+                                        ondelete='cascade',
+                                        help='Backup restored by the job')
+    restore_db_name = fields.Char(string='Restored Database',
+                                  help='Name of the database created by the'
+                                       ' restore')
+    restore_neutralize = fields.Boolean(string='Neutralize',
+                                        help='Neutralize the restored'
+                                             ' database')
+    frequency = fields.Selection(
+        selection=lambda self: self.env['db.backup.configure']._fields[
+            'backup_frequency'].selection,
+        string='Frequency', help='Frequency of the scheduled action which'
+                                 ' queued the job')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, default='pending', index=True,
+        help='Pending: waiting for the backup runner.\n'
+             'Running: backup or restore in progress.\n'
+             'Done: the backup of every configuration, or the restore,'
+             ' succeeded.\n'
+             'Failed: the backup of a configuration or the restore failed,'
+             ' or the runner stopped during the job.')
+    stage = fields.Selection([
+        ('waiting', 'Waiting for Database Load'),
+        ('dump', 'Dump'),
+        ('filestore', 'Filestore'),
+        ('upload', 'Upload'),
+        ('restore', 'Restore'),
+    ], string='Stage', help='Stage reached by the running job')
+    start_time = fields.Datetime(string='Start Time',
+                                 help='Start of the job')
+    end_time = fields.Datetime(string='End Time', help='End of the job')
+    heartbeat = fields.Datetime(string='Last Progress',
+                                help='Last time the runner reported the'
+                                     ' progress of the job')
+    runner = fields.Char(string='Runner',
+                         help='Host and process id of the backup runner'
+                              ' running the job')
+    error = fields.Text(string='Error', help='Errors of the job')
+
+    def _acquire_job(self, job_type=None):
+        """Take the oldest pending job, of `job_type` if given, and mark it
+        as running, committed at once. Concurrent runners skip the jobs
+        locked by each other.
+
+        :return: the job, or an empty recordset when no job is pending
+        """
+        self.env.cr.execute("""
+            SELECT id FROM db_backup_job
+             WHERE state = 'pending'
+               AND (%(job_type)s IS NULL OR job_type = %(job_type)s)
+             ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """, {'job_type': job_type})
+        row = self.env.cr.fetchone()
+        return self.browse(row[0])._start() if row else self.browse()
+
+    def _start(self):
+        """Mark the pending jobs among these as running, committed at once.
+
+        :return: the jobs started, without the ones already taken by a
+            runner
+        """
+        self.env.cr.execute("""
+            UPDATE db_backup_job
+               SET state = 'running',
+                   start_time = now() at time zone 'UTC',
+                   heartbeat = now() at time zone 'UTC',
+                   runner = %s
+             WHERE id IN %s AND state = 'pending'
+         RETURNING id
+        """, [f'{socket.gethostname()}:{os.getpid()}', tuple(self.ids or [0])])
+        jobs = self.browse(row[0] for row in self.env.cr.fetchall())
+        self.env.cr.commit()
+        self.invalidate_recordset()
+        return jobs
+
+    def _run(self, limits=None, session=None):
+        """Back up the configurations of the running jobs, or restore their
+        backup, and record their outcome"""
+        for job in self:
+            configs = job.backup_config_ids.with_context(backup_job_id=job.id)
+            try:
+                if job.job_type == 'restore':
+                    configs._restore_backup(
+                        job.restore_backup_id, job.restore_db_name,
+                        job.restore_neutralize, session)
+                    errors = {}
+                else:
+                    errors = configs._backup_database(limits, session)
+            except Exception as e:
+                _logger.error('Backup job %s failed: %s', job.id, e,
+                              exc_info=True)
+                self.env.cr.rollback()
+                errors = {configs[:1]: e}
+            job.write({
+                'state': 'failed' if errors else 'done',
+                'stage': False,
+                'end_time': fields.Datetime.now(),
+                'error': '\n'.join(
+                    f'{config.name}: {error}'
+                    for config, error in errors.items()) or False,
+            })
+            self.env.cr.commit()
+
+    def _recover_interrupted_jobs(self):
+        """Fail the jobs left running by a runner of this host which is no
+        longer alive, e.g. killed during the backup. The database left
+        incomplete by an interrupted restore is dropped."""
+        host = socket.gethostname()
+        for job in self.search([('state', '=', 'running')]):
+            job_host, _sep, pid = (job.runner or '').rpartition(':')
+            if job_host != host or not pid.isdigit() \
+                    or _pid_exists(int(pid)):
+                continue
+            if job.job_type == 'restore' and job.stage == 'restore' \
+                    and job.restore_db_name in db.list_dbs(True):
+                _logger.warning('Dropping the database %s left incomplete'
+                                ' by the interrupted restore job %s',
+                                job.restore_db_name, job.id)
+                db.exp_drop(job.restore_db_name)
+            job.write({
+                'state': 'failed',
+                'stage': False,
+                'end_time': fields.Datetime.now(),
+                'error': 'The backup runner stopped during the %s'
+                         % job.job_type,
+            })
+        self.env.cr.commit()
+
+    def _cron_run_jobs(self):
+        """Run the pending restore jobs, for the databases without backup
+        runner. The scheduled action is triggered by the Restore Backup
+        wizard and runs the restore in a cron worker, whose time limit is
+        limit_time_real_cron rather than the limit_time_real of the HTTP
+        workers. The backup jobs are run by _schedule_auto_backup."""
+        if self.env['ir.config_parameter'].sudo().get_param(
+                'auto_database_backup.detached_runner'):
+            return
+        self._recover_interrupted_jobs()
+        with new_http_session() as session:
+            while True:
+                job = self._acquire_job('restore')
+                if not job:
+                    return
+                job._run(session=session)
+
+    @api.autovacuum
+    def _gc_finished_jobs(self):
+        """Remove the jobs finished for more than JOB_RETENTION_DAYS days,
+        the backups themselves stay recorded in the backup history"""
+        self.search([
+            ('state', 'in', ['done', 'failed']),
+            ('end_time', '<', fields.Datetime.now() - timedelta(
+                days=JOB_RETENTION_DAYS)),
+        ]).unlink()
+
+
+def _pid_exists(pid):
+    """Return whether a process `pid` runs on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
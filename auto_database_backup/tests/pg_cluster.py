@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+"""Throw-away PostgreSQL clusters for the tests needing a server. The
+binaries are taken from the folder of the environment variable PG_BIN, else
+from the PATH. PostgreSQL refuses to run as root, the tests using a cluster
+are skipped then."""
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+PG_BIN = os.environ.get('PG_BIN') or os.path.dirname(
+    shutil.which('initdb') or '')
+
+
+def skip_reason():
+    """Return why no cluster can be started here, None if one can"""
+    if not PG_BIN or not os.path.exists(os.path.join(PG_BIN, 'initdb')):
+        return 'PostgreSQL binaries not found, set PG_BIN'
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        return 'PostgreSQL can not run as root'
+    return None
+
+
+def pg_tool(name):
+    """Return the path of the PostgreSQL program `name`"""
+    return os.path.join(PG_BIN, name)
+
+
+def free_port():
+    """Return a TCP port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LocalCluster:
+    """PostgreSQL cluster of the data folder `pgdata`, listening on a unix
+    socket in `socket_dir` only"""
+
+    def __init__(self, pgdata, socket_dir):
+        self.pgdata = pgdata
+        self.socket_dir = socket_dir
+        self.port = free_port()
+        self.env = dict(os.environ, PGHOST=socket_dir, PGPORT=str(self.port),
+                        PGUSER='postgres', PGDATABASE='postgres')
+
+    def init(self, **settings):
+        """Create the cluster, with the extra `settings` of
+        postgresql.conf"""
+        subprocess.run([pg_tool('initdb'), '--auth=trust', '--username',
+                        'postgres', '--pgdata', self.pgdata],
+                       check=True, capture_output=True)
+        self.configure(**settings)
+
+    def configure(self, **settings):
+        """Add `settings` to the configuration of the cluster, and make it
+        listen on its own socket"""
+        settings = dict(settings, port=self.port, listen_addresses="''",
+                        unix_socket_directories="'%s'" % self.socket_dir)
+        with open(os.path.join(self.pgdata, 'postgresql.auto.conf'),
+                  'a') as conf:
+            for name, value in settings.items():
+                conf.write('%s = %s\n' % (name, value))
+
+    def start(self):
+        subprocess.run([pg_tool('pg_ctl'), '--pgdata', self.pgdata, '--wait',
+                        '--log', os.path.join(self.pgdata, 'server.log'),
+                        'start'], check=True, capture_output=True)
+
+    def stop(self):
+        subprocess.run([pg_tool('pg_ctl'), '--pgdata', self.pgdata,
+                        '--mode=fast', 'stop'], capture_output=True)
+
+    def psql(self, sql, dbname='postgres'):
+        """Run `sql` and return its output, without headers"""
+        return subprocess.run(
+            [pg_tool('psql'), '--no-psqlrc', '--tuples-only',
+             '--no-align', '--set=ON_ERROR_STOP=1', '--dbname', dbname,
+             '--command', sql],
+            env=self.env, check=True, capture_output=True,
+            text=True).stdout.strip()
+
+    def wait_for(self, sql, expected, timeout=60):
+        """Wait for the query `sql` to return `expected`"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if self.psql(sql) == expected:
+                    return
+            except subprocess.CalledProcessError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError('%s did not return %s' % (sql, expected))
+            time.sleep(0.2)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import datetime
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import dropbox
+
+from tools_loader import load_tools
+
+backup_destinations = load_tools('backup_destinations')
+
+
+class TestListFiles(unittest.TestCase):
+    """Listings of the destinations whose API returns the files in pages"""
+
+    def test_onedrive_pages(self):
+        def page(names, next_link=None):
+            result = {'value': [
+                {'name': name, 'id': 'id-' + name, 'size': 1,
+                 'createdDateTime': '2024-05-13T10:21:03.254Z'}
+                for name in names]}
+            if next_link:
+                result['@odata.nextLink'] = next_link
+            return mock.Mock(json=mock.Mock(return_value=result))
+
+        session = mock.Mock()
+        session.get.side_effect = [
+            page(['a.dump', 'b.dump'], 'https://graph/next'),
+            page(['c.dump']),
+        ]
+        destination = backup_destinations.OnedriveDestination(
+            SimpleNamespace(backup_destination='onedrive', bandwidth_limit=0,
+                            onedrive_folder_key='folder',
+                            onedrive_chunk_size=320,
+                            onedrive_access_token='token'), session)
+        self.assertEqual([file.name for file in destination.list_files()],
+                         ['a.dump', 'b.dump', 'c.dump'])
+        self.assertEqual(session.get.call_args_list[1].args,
+                         ('https://graph/next',))
+
+    def test_dropbox_pages(self):
+        def page(names, cursor=None):
+            return SimpleNamespace(
+                entries=[dropbox.files.FileMetadata(
+                    name=name, path_display='/backups/' + name, size=1,
+                    client_modified=datetime.datetime(2024, 5, 13))
+                    for name in names] + [dropbox.files.FolderMetadata(
+                        name='filestore')],
+                has_more=bool(cursor), cursor=cursor)
+
+        destination = backup_destinations.DropboxDestination(SimpleNamespace(
+            backup_destination='dropbox', bandwidth_limit=0,
+            dropbox_client_key='key', dropbox_client_secret='secret',
+            dropbox_refresh_token='token', dropbox_folder='/backups'))
+        destination.dbx = mock.Mock()
+        destination.dbx.files_list_folder.return_value = page(
+            ['a.dump'], 'first')
+        destination.dbx.files_list_folder_continue.side_effect = [
+            page(['b.dump'], 'second'), page(['c.dump'])]
+        self.assertEqual([file.key for file in destination.list_files()],
+                         ['/backups/a.dump', '/backups/b.dump',
+                          '/backups/c.dump'])
+        self.assertEqual(
+            [call.args for call in
+             destination.dbx.files_list_folder_continue.call_args_list],
+            [('first',), ('second',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
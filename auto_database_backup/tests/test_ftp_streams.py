@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import datetime
+import ftplib
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from tools_loader import load_tools
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import TLS_FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+except ImportError:
+    TLS_FTPHandler = None
+
+download_streams = load_tools('download_streams')
+upload_streams = load_tools('upload_streams')
+
+
+def _write_certificate(path):
+    """Write a self-signed certificate and its key to `path`"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = x509.CertificateBuilder().subject_name(name).issuer_name(
+        name).public_key(key.public_key()).serial_number(
+        x509.random_serial_number()).not_valid_before(now).not_valid_after(
+        now + datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+    with open(path, 'wb') as file:
+        file.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()))
+        file.write(certificate.public_bytes(serialization.Encoding.PEM))
+
+
+@unittest.skipUnless(TLS_FTPHandler, 'pyftpdlib and cryptography are needed')
+class TestFtpsStreams(unittest.TestCase):
+    """Upload and download streams over the encrypted data connections of
+    a local FTPS server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.directory.cleanup)
+        cls.root = os.path.join(cls.directory.name, 'root')
+        os.mkdir(cls.root)
+        certfile = os.path.join(cls.directory.name, 'cert.pem')
+        _write_certificate(certfile)
+        authorizer = DummyAuthorizer()
+        authorizer.add_user('backup', 'secret', cls.root, perm='elradfmw')
+        handler = type('Handler', (TLS_FTPHandler,), {
+            'certfile': certfile,
+            'authorizer': authorizer,
+            'tls_control_required': True,
+            'tls_data_required': True,
+        })
+        cls.server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+        thread = threading.Thread(target=cls.server.serve_forever,
+                                  kwargs={'timeout': 0.1})
+        thread.start()
+        cls.addClassCleanup(thread.join)
+        cls.addClassCleanup(cls.server.close_all)
+
+    def setUp(self):
+        self.ftp = ftplib.FTP_TLS()
+        self.ftp.connect(*self.server.address)
+        self.ftp.login('backup', 'secret')
+        self.ftp.prot_p()
+        self.addCleanup(self.ftp.close)
+
+    def test_upload_download(self):
+        data = os.urandom(300 * 1024)
+        with upload_streams.FtpUpload(self.ftp, 'backup.dump',
+                                      chunk_size=64 * 1024) as upload:
+            upload.write(data)
+        with open(os.path.join(self.root, 'backup.dump'), 'rb') as file:
+            self.assertEqual(file.read(), data)
+        with io.BufferedReader(download_streams.FtpDownload(
+                self.ftp, 'backup.dump')) as download:
+            self.assertEqual(download.read(), data)
+        # The control connection is still in sync
+        self.assertEqual(self.ftp.size('backup.dump'), len(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
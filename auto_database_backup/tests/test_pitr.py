@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import datetime
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+from pg_cluster import LocalCluster, pg_tool, skip_reason
+from tools_loader import load_tools
+
+backup_destinations = load_tools('backup_destinations')
+compression = load_tools('compression')
+pg_tools = load_tools('pg_tools')
+
+
+@unittest.skipIf(skip_reason(), skip_reason())
+class TestPointInTimeRecovery(unittest.TestCase):
+    """Point-in-time recovery against local clusters: base backup, WAL
+    archiving and shipping to a Local Storage destination, then recovery
+    of a copy up to a timestamp, the way the backup configuration runs
+    them."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.archive = os.path.join(self.path, 'archive')
+        os.mkdir(self.archive)
+        self.destination = backup_destinations.LocalDestination(
+            SimpleNamespace(backup_destination='local', bandwidth_limit=0,
+                            backup_path=os.path.join(self.path, 'backups')))
+        self.source = LocalCluster(os.path.join(self.path, 'source'),
+                                   self.path)
+        # The archive_command of the README
+        self.source.init(
+            wal_level='replica', archive_mode='on',
+            archive_command="'cp %%p %(dir)s/%%f.tmp && mv %(dir)s/%%f.tmp "
+                            "%(dir)s/%%f'" % {'dir': self.archive})
+        self.source.start()
+        self.addCleanup(self.source.stop)
+
+    def _ship_wal_files(self):
+        """Upload the archived files to the destination, then remove them"""
+        with self.destination:
+            for name in pg_tools.list_wal_files(self.archive):
+                path = os.path.join(self.archive, name)
+                self.destination.upload_file(path, 'wal/' + name)
+                os.remove(path)
+
+    def test_recovery_to_timestamp(self):
+        source = self.source
+        source.psql('CREATE TABLE sale (id int)')
+        source.psql('INSERT INTO sale VALUES (1)')
+        first_segment = source.psql(
+            'SELECT pg_walfile_name(pg_current_wal_lsn())')
+        name = 'source_base.tar.gz'
+        with self.destination, \
+                self.destination.open_write(name) as upload, \
+                compression.open_compressor(upload, 'gzip') as compressed:
+            peak_rss = pg_tools.run_pg_tool(
+                pg_tools.basebackup_command(pg_tool('pg_basebackup'),
+                                            'source'),
+                source.env, compressed, tool='pg_basebackup')
+        self.assertGreater(peak_rss, 0)
+        source.psql('INSERT INTO sale VALUES (2)')
+        time.sleep(1)
+        target_time = datetime.datetime.fromisoformat(source.psql(
+            "SELECT clock_timestamp() AT TIME ZONE 'UTC'"))
+        time.sleep(1)
+        source.psql('INSERT INTO sale VALUES (3)')
+        segment = source.psql('SELECT pg_walfile_name(pg_switch_wal())')
+        source.wait_for('SELECT last_archived_wal FROM pg_stat_archiver',
+                        segment)
+        self._ship_wal_files()
+        shipped = sorted(os.listdir(os.path.join(
+            self.destination.path, 'wal')))
+        self.assertTrue(any(name.endswith('.backup') for name in shipped))
+
+        # Recover a copy, as _restore_pitr() does
+        copy = LocalCluster(os.path.join(self.path, 'copy'), self.path)
+        with self.destination, self.destination.open_read(name) as download, \
+                compression.open_decompressor(download, 'gzip') as archive:
+            pg_tools.extract_base_backup(archive, copy.pgdata)
+        wal_dir = os.path.join(copy.pgdata, 'wal')
+        os.mkdir(wal_dir)
+        with self.destination:
+            for name in shipped:
+                if pg_tools.is_wal_needed(name, first_segment):
+                    self.destination.download_file(
+                        'wal/' + name, os.path.join(wal_dir, name))
+        pg_tools.write_recovery_config(copy.pgdata, wal_dir, target_time)
+        copy.configure()
+        copy.start()
+        self.addCleanup(copy.stop)
+        copy.wait_for('SELECT pg_is_in_recovery()', 'f')
+        self.assertEqual(copy.psql('SELECT id FROM sale ORDER BY id'),
+                         '1\n2')
+        # The promoted copy does not archive its new timeline into the
+        # archive folder of the source
+        self.assertEqual(copy.psql('SHOW archive_mode'), 'off')
+        copy.psql('INSERT INTO sale VALUES (4)')
+        copy.psql('SELECT pg_switch_wal()')
+        time.sleep(1)
+        self.assertEqual(pg_tools.list_wal_files(self.archive), [])
+
+
+class TestWalFiles(unittest.TestCase):
+
+    def test_wal_needed(self):
+        self.assertTrue(pg_tools.is_wal_needed(
+            '000000010000000000000005', '000000010000000000000005'))
+        self.assertTrue(pg_tools.is_wal_needed(
+            '000000020000000000000006', '000000010000000000000005'))
+        self.assertTrue(pg_tools.is_wal_needed(
+            '00000002.history', '000000010000000000000005'))
+        self.assertFalse(pg_tools.is_wal_needed(
+            '000000010000000000000004.00000028.backup',
+            '000000010000000000000005'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from types import SimpleNamespace
+
+from pg_cluster import LocalCluster, pg_tool, skip_reason
+from tools_loader import load_tools
+
+backup_destinations = load_tools('backup_destinations')
+compression = load_tools('compression')
+pg_tools = load_tools('pg_tools')
+upload_streams = load_tools('upload_streams')
+
+MANIFEST = {'db_name': 'source', 'modules': {'base': '18.0.1.3'}}
+
+
+@unittest.skipIf(skip_reason(), skip_reason())
+class TestRestoreBackup(unittest.TestCase):
+    """Restore of the three backup formats from a Local Storage destination
+    into new databases of a local cluster, with the archives laid out the
+    way the backup configuration writes them, as the restore jobs and the
+    restore check run it."""
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.path = directory.name
+        cls.cluster = LocalCluster(os.path.join(cls.path, 'pgdata'),
+                                   cls.path)
+        cls.cluster.init()
+        cls.cluster.start()
+        cls.addClassCleanup(cls.cluster.stop)
+        cls.cluster.psql('CREATE DATABASE source')
+        cls.cluster.psql('CREATE TABLE sale (id int PRIMARY KEY, note text);'
+                         'INSERT INTO sale SELECT i, md5(i::text)'
+                         ' FROM generate_series(1, 5000) i', 'source')
+
+    def setUp(self):
+        self.destination = backup_destinations.LocalDestination(
+            SimpleNamespace(backup_destination='local', bandwidth_limit=0,
+                            backup_path=os.path.join(self.path, 'backups')))
+        self.filestore = tempfile.mkdtemp(dir=self.path)
+
+    def _pg_dump(self, *args, stream=None):
+        return pg_tools.run_pg_tool(
+            [pg_tool('pg_dump'), '--no-owner', *args, 'source'],
+            self.cluster.env, stream)
+
+    def _upload(self, name, write):
+        """Write the backup `name` compressed with gzip to the destination
+        with `write(stream)`, return the name of the file. Like dump_data(),
+        the compressed stream is written through a CountingWriter, which is
+        not seekable."""
+        name += '.gz'
+        with self.destination, self.destination.open_write(name) as upload, \
+                compression.open_compressor(upload, 'gzip') as compressed:
+            write(upload_streams.CountingWriter(compressed))
+        return name
+
+    def _restore(self, name, db_name):
+        self.cluster.psql('CREATE DATABASE "%s"' % db_name)
+        with self.destination, self.destination.open_read(name) as download, \
+                compression.open_decompressor(download, 'gzip') as source:
+            return pg_tools.restore_backup(
+                source, name[:-len('.gz')], db_name, self.cluster.env,
+                pg_tool, jobs=2, filestore=self.filestore, workers=3)
+
+    def _assert_restored(self, db_name):
+        self.assertEqual(self.cluster.psql(
+            'SELECT count(*), sum(id) FROM sale', db_name), '5000|12502500')
+
+    def test_dump_format(self):
+        name = self._upload('source_dump.dump', lambda stream: self._pg_dump(
+            '--format=c', '--compress=0', stream=stream))
+        self.assertEqual(self._restore(name, 'restored_dump'), {})
+        self._assert_restored('restored_dump')
+
+    def test_directory_format(self):
+        def write(stream):
+            with tempfile.TemporaryDirectory() as dump_dir:
+                dump_path = os.path.join(dump_dir, 'dump')
+                self._pg_dump('--format=d', '--jobs=2', '--compress=0',
+                              '--file=' + dump_path)
+                manifest_path = os.path.join(dump_dir, 'manifest.json')
+                with open(manifest_path, 'w') as fh:
+                    json.dump(MANIFEST, fh)
+                with tarfile.open(fileobj=stream, mode='w|') as tar:
+                    tar.add(manifest_path, arcname='manifest.json')
+                    tar.add(dump_path, arcname='dump')
+
+        name = self._upload('source_dir.tar', write)
+        self.assertEqual(self._restore(name, 'restored_dir'), MANIFEST)
+        self._assert_restored('restored_dir')
+
+    def test_zip_format(self):
+        files = {'ab/ab01': b'first', 'cd/cd02': b'second' * 1000,
+                 'ef/ef03': b''}
+
+        def write(stream):
+            with zipfile.ZipFile(stream, 'w', allowZip64=True) as zipf:
+                with zipf.open('dump.sql', 'w', force_zip64=True) as dump:
+                    self._pg_dump(stream=dump)
+                for file_name, data in files.items():
+                    zipf.writestr('filestore/' + file_name, data)
+                zipf.writestr('manifest.json', json.dumps(MANIFEST))
+
+        name = self._upload('source_zip.zip', write)
+        self.assertEqual(self._restore(name, 'restored_zip'), MANIFEST)
+        self._assert_restored('restored_zip')
+        for file_name, data in files.items():
+            with open(os.path.join(self.filestore, file_name), 'rb') as fh:
+                self.assertEqual(fh.read(), data)
+
+    def test_restore_failure(self):
+        name = self._upload('broken.dump',
+                            lambda stream: stream.write(b'not a dump'))
+        with self.assertRaises(pg_tools.PgToolError) as error:
+            self._restore(name, 'restored_broken')
+        self.assertEqual(error.exception.tool, 'pg_restore')
+        self.assertTrue(error.exception.error)
+
+
+class TestFilestorePath(unittest.TestCase):
+
+    def test_filestore_path(self):
+        with tempfile.TemporaryDirectory() as filestore:
+            path = pg_tools.filestore_path(filestore, 'ab/ab01')
+            self.assertEqual(path, os.path.join(filestore, 'ab', 'ab01'))
+            self.assertTrue(os.path.isdir(os.path.dirname(path)))
+            with self.assertRaises(ValueError):
+                pg_tools.filestore_path(filestore, '../escaped')
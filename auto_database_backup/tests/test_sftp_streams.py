@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+from tools_loader import load_tools
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+backup_destinations = load_tools('backup_destinations')
+upload_streams = load_tools('upload_streams')
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Server(asyncssh.SSHServer if asyncssh else object):
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        return password == 'secret'
+
+
+@unittest.skipUnless(asyncssh, 'asyncssh is needed')
+class TestSftpUpload(unittest.TestCase):
+    """Uploads of the SFTP destination to a local asyncssh SFTP server,
+    written through several channels"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.directory.cleanup)
+        cls.root = cls.directory.name
+        cls.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=cls.loop.run_forever)
+        thread.start()
+        cls.addClassCleanup(thread.join)
+        cls.addClassCleanup(cls.loop.call_soon_threadsafe, cls.loop.stop)
+        cls.server = asyncio.run_coroutine_threadsafe(
+            cls._start_server(), cls.loop).result()
+        cls.addClassCleanup(cls.server.close)
+
+    @classmethod
+    async def _start_server(cls):
+        return await asyncssh.create_server(
+            _Server, '127.0.0.1', 0,
+            server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+            sftp_factory=lambda channel: asyncssh.SFTPServer(
+                channel, chroot=cls.root))
+
+    def setUp(self):
+        self.destination = backup_destinations.SftpDestination(
+            SimpleNamespace(
+                backup_destination='sftp', sftp_host='127.0.0.1',
+                sftp_port=self.server.sockets[0].getsockname()[1],
+                sftp_user='backup', sftp_password='secret',
+                sftp_path='backups', bandwidth_limit=0))
+        self.destination.connect()
+        self.addCleanup(self.destination.close)
+
+    def _upload(self, name, data, **kwargs):
+        upload = upload_streams.SftpUpload(
+            self.destination.sftp, name, self.destination._open_channel,
+            chunk_size=CHUNK_SIZE, **kwargs)
+        with upload:
+            for index in range(0, len(data), 10000):
+                upload.write(data[index:index + 10000])
+        return upload
+
+    def _read(self, name):
+        with open(os.path.join(self.root, 'backups', name), 'rb') as file:
+            return file.read()
+
+    def test_parallel_upload(self):
+        data = os.urandom(10 * CHUNK_SIZE + 1234)
+        opened = []
+        open_channel = self.destination._open_channel
+
+        def count_channel():
+            opened.append(open_channel())
+            return opened[-1]
+
+        self.destination._open_channel = count_channel
+        self._upload('backup.dump', data, channels=3)
+        self.assertEqual(self._read('backup.dump'), data)
+        self.assertEqual(len(opened), 2)
+        self.assertTrue(all(sftp.sock.closed for sftp in opened))
+
+    def test_small_file_single_channel(self):
+        self.destination._open_channel = None
+        self._upload('small.dump', b'small')
+        self.assertEqual(self._read('small.dump'), b'small')
+        self._upload('empty.dump', b'')
+        self.assertEqual(self._read('empty.dump'), b'')
+
+    def test_upload_file(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(data)
+            file.flush()
+            self.destination.upload_file(file.name, 'folder/file.dump')
+        self.assertEqual(self._read('folder/file.dump'), data)
+
+    def test_size_mismatch(self):
+        """A write lost without error, as pipelined writes may be, fails the
+        size check and the partial file is removed"""
+        write_chunk = upload_streams.SftpUpload._write_chunk
+
+        def lose_chunk(upload, file, chunk, offset):
+            if offset != CHUNK_SIZE * 4:
+                write_chunk(upload, file, chunk, offset)
+
+        upload_streams.SftpUpload._write_chunk = lose_chunk
+        self.addCleanup(setattr, upload_streams.SftpUpload, '_write_chunk',
+                        write_chunk)
+        with self.assertRaisesRegex(IOError, 'size mismatch'):
+            self._upload('lost.dump', os.urandom(5 * CHUNK_SIZE))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'backups', 'lost.dump')))
+
+    def test_write_error_aborts(self):
+        def fail(upload, file, chunk, offset):
+            raise IOError('disk full')
+
+        upload = upload_streams.SftpUpload(
+            self.destination.sftp, 'failed.dump',
+            self.destination._open_channel, chunk_size=CHUNK_SIZE)
+        upload._write_chunk = fail.__get__(upload)
+        with self.assertRaisesRegex(IOError, 'disk full'):
+            with upload:
+                upload.write(os.urandom(20 * CHUNK_SIZE))
+        self.assertTrue(upload.closed)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'backups', 'failed.dump')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import errno
+import gc
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tools_loader import load_tools
+
+upload_streams = load_tools('upload_streams')
+
+
+class StubUpload(upload_streams.ChunkedUploadStream):
+    """Upload recording the calls of the hooks, failing on demand"""
+
+    def __init__(self, chunk_size=4, fail_on=None):
+        super().__init__(chunk_size)
+        self.fail_on = fail_on
+        self.chunks = []
+        self.calls = []
+
+    def _upload_chunk(self, chunk, final):
+        if self.fail_on == 'final' and final:
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        self.chunks.append((self.offset, chunk, final))
+
+    def _complete(self):
+        self.calls.append('complete')
+        if self.fail_on == 'complete':
+            raise OSError(errno.ENOSPC, 'No space left on device')
+
+    def _abort(self):
+        self.calls.append('abort')
+
+
+class TestChunkedUploadStream(unittest.TestCase):
+
+    def test_chunks(self):
+        """Full chunks are sent as they fill up, the last one on close"""
+        stream = StubUpload()
+        stream.write(b'abcdef')
+        stream.write(b'ghij')
+        self.assertEqual(stream.chunks, [(0, b'abcd', False),
+                                         (4, b'efgh', False)])
+        stream.close()
+        self.assertEqual(stream.chunks[-1], (8, b'ij', True))
+        self.assertEqual(stream.calls, ['complete'])
+        self.assertTrue(stream.closed)
+
+    def test_context_manager(self):
+        """The upload is completed on success and aborted on error"""
+        with StubUpload() as stream:
+            stream.write(b'abc')
+        self.assertEqual(stream.calls, ['complete'])
+        with self.assertRaises(RuntimeError):
+            with StubUpload() as stream:
+                stream.write(b'abc')
+                raise RuntimeError()
+        self.assertEqual(stream.calls, ['abort'])
+        self.assertTrue(stream.closed)
+
+    def test_close_failure(self):
+        """A failure of the last chunk or of the completion aborts"""
+        for fail_on, calls in (('final', ['abort']),
+                               ('complete', ['complete', 'abort'])):
+            stream = StubUpload(fail_on=fail_on)
+            stream.write(b'abcdef')
+            with self.assertRaises(OSError):
+                stream.close()
+            self.assertEqual(stream.calls, calls)
+            self.assertTrue(stream.closed)
+            stream.close()
+            self.assertEqual(stream.calls, calls)
+
+    def test_garbage_collected(self):
+        """A stream dropped without being closed is aborted"""
+        calls = []
+        stream = StubUpload()
+        stream.calls = calls
+        stream.write(b'abcdef')
+        del stream
+        gc.collect()
+        self.assertEqual(calls, ['abort'])
+
+    def test_abort_failure(self):
+        """An error while aborting is logged, not raised"""
+        stream = StubUpload()
+        with mock.patch.object(stream, '_abort', side_effect=OSError()), \
+                self.assertLogs(upload_streams._logger, 'WARNING'):
+            stream.abort()
+        self.assertTrue(stream.closed)
+
+
+class TestLocalFileUpload(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'backup.dump')
+
+    def test_upload(self):
+        with upload_streams.LocalFileUpload(self.path, chunk_size=4) as file:
+            file.write(b'0123456789')
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), b'0123456789')
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+    def test_complete_failure(self):
+        """The part file is removed when it can not be completed"""
+        stream = upload_streams.LocalFileUpload(self.path, chunk_size=4)
+        stream.write(b'0123456789')
+        with mock.patch.object(upload_streams.os, 'replace',
+                               side_effect=OSError(errno.ENOSPC, 'Full')):
+            with self.assertRaises(OSError):
+                stream.close()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+    def test_garbage_collected(self):
+        stream = upload_streams.LocalFileUpload(self.path, chunk_size=4)
+        stream.write(b'0123456789')
+        del stream
+        gc.collect()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+
+class TestS3MultipartUpload(unittest.TestCase):
+
+    def test_complete_failure(self):
+        """A multipart upload which can not be completed is aborted, so the
+        parts are not billed forever"""
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {'UploadId': 'id'}
+        client.upload_part.return_value = {'ETag': 'etag'}
+        client.complete_multipart_upload.side_effect = OSError()
+        size = upload_streams.S3MultipartUpload.MIN_PART_SIZE
+        stream = upload_streams.S3MultipartUpload(client, 'bucket', 'key',
+                                                  chunk_size=size)
+        stream.write(b'x' * (size + 1))
+        with self.assertRaises(OSError):
+            stream.close()
+        client.abort_multipart_upload.assert_called_once_with(
+            Bucket='bucket', Key='key', UploadId='id')
+
+    def _upload(self, data, size=None, **limits):
+        """Return the part sizes and the client used to upload `data` with
+        the S3 `limits` scaled down to bytes"""
+        client = mock.Mock()
+        client.create_multipart_upload.return_value = {'UploadId': 'id'}
+        client.upload_part.return_value = {'ETag': 'etag'}
+        upload_class = type('ScaledUpload', (
+            upload_streams.S3MultipartUpload,), dict(
+            MIN_PART_SIZE=4, MAX_PART_SIZE=16, **limits))
+        stream = upload_class(client, 'bucket', 'key', chunk_size=4,
+                              max_concurrency=2, size=size)
+        with stream:
+            for index in range(0, len(data), 3):
+                stream.write(data[index:index + 3])
+        parts = sorted(client.upload_part.call_args_list,
+                       key=lambda call: call.kwargs['PartNumber'])
+        return [len(call.kwargs['Body']) for call in parts], client
+
+    def test_part_size_grows(self):
+        """The parts of a file of unknown size double every PARTS_PER_SIZE
+        parts, up to MAX_PART_SIZE"""
+        sizes, client = self._upload(b'x' * 90, PARTS_PER_SIZE=2,
+                                     MAX_PARTS=100)
+        self.assertEqual(sizes, [4, 4, 8, 8, 16, 16, 16, 16, 2])
+        self.assertEqual(
+            [part['PartNumber'] for part in client.complete_multipart_upload
+             .call_args.kwargs['MultipartUpload']['Parts']],
+            list(range(1, 10)))
+
+    def test_part_size_from_size(self):
+        """A file of known size is split into at most MAX_PARTS parts"""
+        sizes, _client = self._upload(b'x' * 38, size=38, MAX_PARTS=4)
+        self.assertEqual(sizes, [10, 10, 10, 8])
+
+    def test_too_many_parts(self):
+        """The upload fails as soon as it needs more than MAX_PARTS parts,
+        and is aborted"""
+        with self.assertRaisesRegex(ValueError, '3 parts'):
+            self._upload(b'x' * 20, PARTS_PER_SIZE=100, MAX_PARTS=3)
+        with self.assertRaisesRegex(ValueError, 'exceed'):
+            self._upload(b'', size=100, MAX_PARTS=3)
+
+
+class TestResumableHttpUpload(unittest.TestCase):
+
+    def _upload(self, data, total_size=None):
+        """Return the Content-Range headers sent to upload `data`"""
+        session = mock.Mock()
+        session.put.return_value = mock.Mock(status_code=200)
+        size = upload_streams.OnedriveUpload.chunk_alignment
+        with upload_streams.OnedriveUpload(
+                'https://upload', chunk_size=size, session=session,
+                total_size=total_size) as stream:
+            stream.write(data)
+        return [call.kwargs['headers']['Content-Range']
+                for call in session.put.call_args_list]
+
+    def test_known_size(self):
+        """Every range carries the total size when it is known"""
+        size = upload_streams.OnedriveUpload.chunk_alignment
+        total = 2 * size + 10
+        self.assertEqual(self._upload(b'x' * total, total), [
+            'bytes 0-%s/%s' % (size - 1, total),
+            'bytes %s-%s/%s' % (size, 2 * size - 1, total),
+            'bytes %s-%s/%s' % (2 * size, total - 1, total),
+        ])
+
+    def test_unknown_size(self):
+        """A streamed upload only announces its size with the last chunk"""
+        size = upload_streams.OnedriveUpload.chunk_alignment
+        self.assertEqual(self._upload(b'x' * (size + 10)), [
+            'bytes 0-%s/*' % (size - 1),
+            'bytes %s-%s/%s' % (size, size + 9, size + 10),
+        ])
+
+
+@mock.patch.object(upload_streams.time, 'sleep')
+class TestResumableHttpUploadRetry(unittest.TestCase):
+    size = upload_streams.GoogleDriveUpload.chunk_alignment
+
+    def _upload(self, responses, data, max_retries=2):
+        """Upload `data` to Google Drive with `responses` as the successive
+        results of the PUT requests, return their Content-Range headers"""
+        session = mock.Mock()
+        session.put.side_effect = responses
+        try:
+            with upload_streams.GoogleDriveUpload(
+                    'https://upload', chunk_size=self.size, session=session,
+                    max_retries=max_retries) as stream:
+                stream.write(data)
+        finally:
+            self.ranges = [call.kwargs['headers']['Content-Range']
+                           for call in session.put.call_args_list]
+
+    @staticmethod
+    def _response(status_code, received=None):
+        headers = {'Range': 'bytes=0-%s' % (received - 1)} if received else {}
+        return mock.Mock(status_code=status_code, headers=headers)
+
+    def test_transient_status(self, sleep):
+        """A transient status resumes from the offset the service reports"""
+        size = self.size
+        self._upload([self._response(503), self._response(308, 100),
+                      self._response(308, size), self._response(200)],
+                     b'x' * (size + 10))
+        self.assertEqual(self.ranges, [
+            'bytes 0-%s/*' % (size - 1),
+            'bytes */*',
+            'bytes 100-%s/*' % (size - 1),
+            'bytes %s-%s/%s' % (size, size + 9, size + 10),
+        ])
+        sleep.assert_called_once_with(upload_streams.UPLOAD_RETRY_DELAY)
+
+    def test_lost_response(self, sleep):
+        """A chunk received whole is not sent again when its response is
+        lost"""
+        size = self.size
+        self._upload([upload_streams.requests.ConnectionError(),
+                      self._response(308, size), self._response(200)],
+                     b'x' * (size + 10))
+        self.assertEqual(self.ranges, [
+            'bytes 0-%s/*' % (size - 1),
+            'bytes */*',
+            'bytes %s-%s/%s' % (size, size + 9, size + 10),
+        ])
+
+    def test_partial_chunk(self, sleep):
+        """The bytes missing from a 308 Range are sent again at once"""
+        size = self.size
+        self._upload([self._response(308, size - 100),
+                      self._response(308, size), self._response(200)],
+                     b'x' * (size + 10))
+        self.assertEqual(self.ranges, [
+            'bytes 0-%s/*' % (size - 1),
+            'bytes %s-%s/*' % (size - 100, size - 1),
+            'bytes %s-%s/%s' % (size, size + 9, size + 10),
+        ])
+        sleep.assert_not_called()
+
+    def test_partial_final_chunk(self, sleep):
+        """A final chunk acknowledged in part is completed too"""
+        self._upload([self._response(308, 4), self._response(200)],
+                     b'x' * 10)
+        self.assertEqual(self.ranges, ['bytes 0-9/10', 'bytes 4-9/10'])
+
+    def test_onedrive_partial_chunk(self, sleep):
+        """Onedrive lists the bytes missing from a chunk in a 202 response"""
+        size = upload_streams.OnedriveUpload.chunk_alignment
+        session = mock.Mock()
+        session.put.side_effect = [
+            mock.Mock(status_code=202, **{'json.return_value': {
+                'nextExpectedRanges': ['%s-' % (size - 100)]}}),
+            mock.Mock(status_code=202, **{'json.return_value': {
+                'nextExpectedRanges': ['%s-' % size]}}),
+            mock.Mock(status_code=201)]
+        with upload_streams.OnedriveUpload(
+                'https://upload', chunk_size=size, session=session) as stream:
+            stream.write(b'x' * (size + 10))
+        self.assertEqual([call.kwargs['headers']['Content-Range']
+                          for call in session.put.call_args_list], [
+            'bytes 0-%s/*' % (size - 1),
+            'bytes %s-%s/*' % (size - 100, size - 1),
+            'bytes %s-%s/%s' % (size, size + 9, size + 10),
+        ])
+
+    def test_no_progress(self, sleep):
+        """A chunk the service keeps refusing fails after the retries"""
+        size = self.size
+        responses = [self._response(308, 100), self._response(308, 100)] * 3
+        with self.assertRaises(upload_streams.requests.HTTPError):
+            self._upload(responses, b'x' * (size + 10))
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_retries_exhausted(self, sleep):
+        """The last failure is raised once the retries are spent"""
+        responses = [self._response(503), self._response(308)] * 2 + \
+            [self._response(503)]
+        with self.assertRaises(upload_streams.requests.HTTPError):
+            self._upload(responses, b'x' * 10)
+        self.assertEqual(self.ranges, ['bytes 0-9/10', 'bytes */*'] * 2 +
+                         ['bytes 0-9/10'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+"""Import the modules of the tools package without Odoo.
+
+The tests of this folder only cover the Odoo-free tools layer. They are run
+from this folder with `python -m pytest`, there is no `__init__.py` so that
+Odoo does not try to load them."""
+import importlib
+import os
+import sys
+import types
+
+TOOLS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, 'tools')
+PACKAGE = 'auto_database_backup_tools'
+
+
+def load_tools(name):
+    """Return the module `name` of the tools package. The package itself is
+    registered without running its `__init__`, which imports Odoo."""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [TOOLS_PATH]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module('%s.%s' % (PACKAGE, name))
@@ -0,0 +1,886 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import errno
+import ftplib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from urllib.parse import quote, unquote
+from xml.etree import ElementTree
+
+import boto3
+import dropbox
+import paramiko
+import requests
+from boto3.s3.transfer import MB, TransferConfig
+from requests.adapters import HTTPAdapter
+
+from .backup_limits import TokenBucket
+from .download_streams import FtpDownload, HttpDownload
+from .upload_streams import (UPLOAD_RETRIES, UPLOAD_RETRY_DELAY,
+                             DropboxUploadSession, FtpUpload,
+                             GoogleDriveUpload, LocalFileUpload,
+                             NextcloudChunkedUpload, OnedriveUpload,
+                             S3MultipartUpload, SftpUpload)
+
+_logger = logging.getLogger(__name__)
+
+MICROSOFT_GRAPH_END_POINT = "https://graph.microsoft.com"
+GOOGLE_API_BASE_URL = 'https://www.googleapis.com'
+# Size of the blocks read from a local backup file while uploading it
+COPY_CHUNK_SIZE = 1024 * 1024
+# Number of keep-alive connections kept per host by the HTTP sessions
+HTTP_POOL_SIZE = 16
+# Maximum number of files per page of a Google Drive listing, and of calls
+# per Google Drive batch request
+GOOGLE_DRIVE_PAGE_SIZE = 1000
+GOOGLE_DRIVE_BATCH_SIZE = 100
+# Maximum number of keys per S3 delete_objects request
+S3_DELETE_BATCH_SIZE = 1000
+# Flow control window and maximum packet size the SFTP client advertises.
+# The paramiko defaults (2 MiB and 32 KiB) cap the downloads of high latency
+# links to a window per round trip. The uploads are bounded by the window of
+# the server instead, they are written through several channels (see
+# SftpUpload).
+SFTP_WINDOW_SIZE = 64 * 1024 * 1024
+SFTP_MAX_PACKET_SIZE = 256 * 1024
+# Read requests of 32 KiB a SFTP download keeps in flight, 8 MiB. paramiko
+# would otherwise request the whole file at once: the data received ahead
+# of the reader piles up in its channel buffer, whose reads get slower as it
+# grows, until the download crawls.
+SFTP_PREFETCH_REQUESTS = 256
+# Properties requested when listing a Nextcloud folder
+NEXTCLOUD_PROPFIND_BODY = """<?xml version="1.0"?>
+<d:propfind xmlns:d="DAV:">
+  <d:prop>
+    <d:getlastmodified/>
+    <d:getcontentlength/>
+    <d:resourcetype/>
+  </d:prop>
+</d:propfind>"""
+
+# File stored at a destination, `modified` is a naive UTC datetime and `key`
+# the identifier the storage needs to address the file, if any
+BackupFile = namedtuple('BackupFile', ['name', 'modified', 'size', 'key'],
+                        defaults=[None, None])
+
+
+class BackupDestination:
+    """Connection to the storage of a backup configuration.
+
+    The values needed are copied from the `db.backup.configure` record when
+    the destination is created, so a destination can be used without
+    touching the record again. Use it as a context manager to open and
+    close the connection. File names are relative to the backup folder and
+    may contain `/` to address sub folders.
+
+    The HTTP based destinations send their requests through `session`, a
+    requests.Session shared by all the destinations of a backup run so that
+    connections are reused (see new_http_session()).
+
+    `location` identifies the backup folder, it is recorded with the backups
+    in the catalog so that a backup is only pruned from where it was
+    stored. The uploads are throttled to the bandwidth limit of the
+    configuration by `throttle`, a TokenBucket."""
+    location = None
+
+    def __init__(self, config, session=None):
+        self.name = config.backup_destination
+        self.session = session or new_http_session()
+        self.throttle = TokenBucket(config.bandwidth_limit * 1024) \
+            if config.bandwidth_limit else None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        """Open the connection to the storage"""
+
+    def close(self):
+        """Close the connection to the storage"""
+
+    def open_write(self, name, size=None):
+        """Return a writable upload stream (see ChunkedUploadStream) for the
+        file `name`, throttled to the bandwidth limit. `size` is the size of
+        the file when it is known in advance, None for a streamed backup."""
+        upload = self._open_write(name, size)
+        upload.throttle = self.throttle
+        return upload
+
+    def _open_write(self, name, size=None):
+        """Return the upload stream of the storage for the file `name` of
+        `size` bytes"""
+        raise NotImplementedError()
+
+    def delete(self, name):
+        """Remove the file `name`"""
+        raise NotImplementedError()
+
+    def upload_file(self, path, name):
+        """Upload the local file `path` as `name`"""
+        with open(path, 'rb') as file, \
+                self.open_write(name, os.path.getsize(path)) as upload:
+            shutil.copyfileobj(file, upload, COPY_CHUNK_SIZE)
+
+    def open_read(self, name):
+        """Return a readable stream of the file `name`, downloaded while it
+        is read"""
+        raise NotImplementedError()
+
+    def _open_url(self, url, session, headers=None):
+        """Return a readable stream of the body of `url`, downloaded with
+        `session`"""
+        return io.BufferedReader(
+            HttpDownload(session.get(url, headers=headers, stream=True)),
+            COPY_CHUNK_SIZE)
+
+    def download_file(self, name, path):
+        """Download the file `name` to the local file `path`"""
+        with self.open_read(name) as download, open(path, 'wb') as file:
+            shutil.copyfileobj(download, file, COPY_CHUNK_SIZE)
+
+    def list_files(self):
+        """Return the BackupFile of the files of the backup folder, sub
+        folders are not listed"""
+        raise NotImplementedError()
+
+    def delete_files(self, files):
+        """Remove the BackupFile `files` returned by list_files()"""
+        for file in files:
+            self.delete(file.name)
+
+    def delete_backups(self, names):
+        """Remove the backup files `names` without listing the folder, the
+        catalog of the backups tells which files exist"""
+        for name in names:
+            self.delete(name)
+
+
+class LocalDestination(BackupDestination):
+    """Directory of the Odoo server"""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.path = config.backup_path
+        self.location = self.path
+
+    def _open_write(self, name, size=None):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return LocalFileUpload(path)
+
+    def delete(self, name):
+        os.remove(os.path.join(self.path, name))
+
+    def open_read(self, name):
+        return open(os.path.join(self.path, name), 'rb')
+
+    def download_file(self, name, path):
+        shutil.copyfile(os.path.join(self.path, name), path)
+
+    def list_files(self):
+        files = []
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if os.path.isfile(path):
+                files.append(BackupFile(
+                    name, datetime.utcfromtimestamp(os.path.getctime(path)),
+                    os.path.getsize(path)))
+        return files
+
+
+class FtpDestination(BackupDestination):
+    """Folder of a FTP server"""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.host = config.ftp_host
+        self.port = int(config.ftp_port)
+        self.user = config.ftp_user
+        self.password = config.ftp_password
+        self.path = config.ftp_path
+        self.use_tls = config.ftp_use_tls
+        self.block_size = config.ftp_block_size * 1024
+        self.location = f"ftp://{self.host}:{self.port}/{self.path}"
+        self.ftp = None
+        self._folders = set()
+
+    def connect(self):
+        self.ftp = ftplib.FTP_TLS() if self.use_tls else ftplib.FTP()
+        self.ftp.connect(self.host, self.port)
+        self.ftp.login(self.user, self.password)
+        if self.use_tls:
+            # Encrypt the data connections as well
+            self.ftp.prot_p()
+        self.ftp.encoding = "utf-8"
+        try:
+            self.ftp.cwd(self.path)
+        except ftplib.error_perm:
+            self.ftp.mkd(self.path)
+            self.ftp.cwd(self.path)
+
+    def close(self):
+        try:
+            self.ftp.quit()
+        except Exception:
+            self.ftp.close()
+
+    def _make_folders(self, name):
+        """Create the sub folders of `name` missing on the server"""
+        folder = ''
+        for part in name.split('/')[:-1]:
+            folder = folder + '/' + part if folder else part
+            if folder not in self._folders:
+                try:
+                    self.ftp.mkd(folder)
+                except ftplib.error_perm:
+                    pass
+                self._folders.add(folder)
+
+    def _open_write(self, name, size=None):
+        self._make_folders(name)
+        return FtpUpload(self.ftp, name, chunk_size=self.block_size)
+
+    def delete(self, name):
+        self.ftp.delete(name)
+
+    def open_read(self, name):
+        return io.BufferedReader(FtpDownload(self.ftp, name), self.block_size)
+
+    def download_file(self, name, path):
+        with open(path, 'wb') as file:
+            self.ftp.retrbinary('RETR %s' % name, file.write, self.block_size)
+
+    def upload_file(self, path, name):
+        """Upload `path` in blocks of `block_size` bytes. An interrupted
+        transfer is resumed with `REST` from the size of the file on the
+        server, after reconnecting."""
+        self._make_folders(name)
+        throttle = self.throttle and (
+            lambda block: self.throttle.consume(len(block)))
+        offset = 0
+        for attempt in range(UPLOAD_RETRIES + 1):
+            try:
+                with open(path, 'rb') as file:
+                    file.seek(offset)
+                    self.ftp.storbinary('STOR %s' % name, file,
+                                        self.block_size, callback=throttle,
+                                        rest=offset or None)
+                return
+            except (OSError, EOFError, ftplib.error_temp,
+                    ftplib.error_reply) as error:
+                if attempt == UPLOAD_RETRIES:
+                    raise
+                delay = UPLOAD_RETRY_DELAY * 2 ** attempt
+                _logger.warning('FTP upload of %s interrupted (%s), resuming'
+                                ' in %s seconds', name, error, delay)
+                time.sleep(delay)
+                self.ftp.close()
+                self.connect()
+                offset = self._get_size(name)
+
+    def _get_size(self, name):
+        """Return the size of the file `name` on the server, 0 if missing"""
+        try:
+            self.ftp.voidcmd('TYPE I')
+            return self.ftp.size(name) or 0
+        except ftplib.error_perm:
+            return 0
+
+    def list_files(self):
+        """List the folder with a single `MLSD` command, the servers not
+        supporting it are asked the modification time of every file"""
+        try:
+            entries = list(self.ftp.mlsd(facts=['type', 'modify', 'size']))
+        except ftplib.error_perm:
+            return self._list_files_mdtm()
+        return [
+            BackupFile(name,
+                       datetime.strptime(facts['modify'][:14],
+                                         "%Y%m%d%H%M%S"),
+                       int(facts['size']) if 'size' in facts else None)
+            for name, facts in entries
+            if facts.get('type') == 'file' and 'modify' in facts
+        ]
+
+    def _list_files_mdtm(self):
+        """List the folder with `NLST` and one `MDTM` per file"""
+        files = []
+        for name in self.ftp.nlst():
+            try:
+                modified = datetime.strptime(
+                    self.ftp.sendcmd('MDTM ' + name)[4:], "%Y%m%d%H%M%S")
+            except ftplib.error_perm:
+                # Folders have no modification time
+                continue
+            files.append(BackupFile(name, modified))
+        return files
+
+
+class SftpDestination(BackupDestination):
+    """Folder of a SFTP server"""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.host = config.sftp_host
+        self.port = config.sftp_port
+        self.user = config.sftp_user
+        self.password = config.sftp_password
+        self.path = config.sftp_path
+        self.location = f"sftp://{self.host}:{self.port}/{self.path}"
+        self.client = self.sftp = None
+        self._folders = set()
+
+    def connect(self):
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(hostname=self.host, username=self.user,
+                            password=self.password, port=self.port)
+        self.sftp = self._open_channel(chdir=False)
+        try:
+            self.sftp.chdir(self.path)
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                self.sftp.mkdir(self.path)
+                self.sftp.chdir(self.path)
+
+    def _open_channel(self, chdir=True):
+        """Open a SFTP channel of the connection, in the folder of the
+        destination"""
+        sftp = paramiko.SFTPClient.from_transport(
+            self.client.get_transport(), window_size=SFTP_WINDOW_SIZE,
+            max_packet_size=SFTP_MAX_PACKET_SIZE)
+        if chdir:
+            sftp.chdir(self.path)
+        return sftp
+
+    def close(self):
+        if self.sftp:
+            self.sftp.close()
+        self.client.close()
+
+    def _make_folders(self, name):
+        """Create the sub folders of `name` missing on the server"""
+        folder = ''
+        for part in name.split('/')[:-1]:
+            folder = folder + '/' + part if folder else part
+            if folder not in self._folders:
+                try:
+                    self.sftp.mkdir(folder)
+                except IOError:
+                    pass
+                self._folders.add(folder)
+
+    def _open_write(self, name, size=None):
+        self._make_folders(name)
+        return SftpUpload(self.sftp, name, self._open_channel)
+
+    def delete(self, name):
+        self.sftp.remove(name)
+
+    def open_read(self, name):
+        """Open the file with SFTP_PREFETCH_REQUESTS read-ahead requests in
+        flight"""
+        file = self.sftp.open(name, 'rb')
+        file.prefetch(max_concurrent_requests=SFTP_PREFETCH_REQUESTS)
+        return file
+
+    def download_file(self, name, path):
+        self.sftp.get(name, path,
+                      max_concurrent_prefetch_requests=SFTP_PREFETCH_REQUESTS)
+
+    def list_files(self):
+        """List the folder with the attributes of its files in one
+        `listdir_attr` instead of a `stat` per file"""
+        files = []
+        for attributes in self.sftp.listdir_attr():
+            if stat.S_ISDIR(attributes.st_mode):
+                continue
+            files.append(BackupFile(
+                attributes.filename,
+                datetime.utcfromtimestamp(attributes.st_mtime),
+                attributes.st_size))
+        return files
+
+
+class GoogleDriveDestination(BackupDestination):
+    """Google Drive folder. Drive has no paths, a `/` in a file name is kept
+    as part of the name."""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.folder = config.google_drive_folder_key
+        self.location = self.folder
+        self.headers = {
+            "Authorization": "Bearer %s" % config.gdrive_access_token}
+
+    def _open_write(self, name, size=None):
+        metadata = {
+            "name": name,
+            "parents": [self.folder],
+        }
+        response = self.session.post(
+            f"{GOOGLE_API_BASE_URL}/upload/drive/v3/files"
+            f"?uploadType=resumable",
+            headers=dict(self.headers, **{
+                'Content-Type': 'application/json; charset=UTF-8'}),
+            data=json.dumps(metadata))
+        response.raise_for_status()
+        return GoogleDriveUpload(response.headers['Location'],
+                                 headers=self.headers, session=self.session,
+                                 total_size=size)
+
+    def list_files(self):
+        return self._search("'%s' in parents and trashed = false"
+                            % self.folder)
+
+    def _get_file_id(self, name):
+        """Return the id of the file `name` of the folder"""
+        files = self._search("name = '%s' and '%s' in parents and"
+                             " trashed = false" % (name.replace("'", "\\'"),
+                                                   self.folder))
+        if not files:
+            raise FileNotFoundError("%s not found on Google Drive" % name)
+        return files[0].key
+
+    def open_read(self, name):
+        return self._open_url(
+            f"{GOOGLE_API_BASE_URL}/drive/v3/files/{self._get_file_id(name)}"
+            f"?alt=media", self.session, headers=self.headers)
+
+    def _search(self, query):
+        """Return the BackupFile of the files matching the Drive `query`,
+        following every page of the result"""
+        params = {
+            'q': query,
+            'fields': 'nextPageToken, files(id, name, mimeType, createdTime,'
+                      ' size)',
+            'pageSize': GOOGLE_DRIVE_PAGE_SIZE,
+        }
+        files = []
+        while True:
+            response = self.session.get(
+                f"{GOOGLE_API_BASE_URL}/drive/v3/files", params=params,
+                headers=self.headers)
+            response.raise_for_status()
+            result = response.json()
+            for file in result['files']:
+                if file['mimeType'] == 'application/vnd.google-apps.folder':
+                    continue
+                files.append(BackupFile(
+                    file['name'], _parse_iso_datetime(file['createdTime']),
+                    int(file.get('size', 0)), file['id']))
+            if not result.get('nextPageToken'):
+                return files
+            params['pageToken'] = result['nextPageToken']
+
+    def delete_files(self, files):
+        """Delete the files with batch requests of GOOGLE_DRIVE_BATCH_SIZE
+        calls, files already gone are ignored"""
+        for index in range(0, len(files), GOOGLE_DRIVE_BATCH_SIZE):
+            boundary = 'batch_%s' % uuid.uuid4().hex
+            body = ''.join(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <{file.key}>\r\n\r\n"
+                f"DELETE /drive/v3/files/{file.key} HTTP/1.1\r\n\r\n"
+                for file in files[index:index + GOOGLE_DRIVE_BATCH_SIZE]
+            ) + f"--{boundary}--\r\n"
+            response = self.session.post(
+                f"{GOOGLE_API_BASE_URL}/batch/drive/v3", data=body,
+                headers=dict(self.headers, **{
+                    'Content-Type': f'multipart/mixed; boundary={boundary}'}))
+            response.raise_for_status()
+            statuses = [int(status) for status in re.findall(
+                r'^HTTP/[\d.]+ (\d{3})', response.text, re.MULTILINE)]
+            failed = [status for status in statuses
+                      if status >= 300 and status != 404]
+            if failed:
+                raise ValueError("Google Drive batch delete failed with"
+                                 " status %s" % failed[0])
+
+    def delete_backups(self, names):
+        """Look the ids of the files up with one query per
+        GOOGLE_DRIVE_BATCH_SIZE names and delete them in batches"""
+        for index in range(0, len(names), GOOGLE_DRIVE_BATCH_SIZE):
+            query = "'%s' in parents and trashed = false and (%s)" % (
+                self.folder, ' or '.join(
+                    "name = '%s'" % name.replace("'", "\\'")
+                    for name in names[index:index + GOOGLE_DRIVE_BATCH_SIZE]))
+            self.delete_files(self._search(query))
+
+    def delete(self, name):
+        query = "name = '%s' and '%s' in parents and trashed = false" % (
+            name.replace("'", "\\'"), self.folder)
+        response = self.session.get(f"{GOOGLE_API_BASE_URL}/drive/v3/files",
+                                    params={'q': query, 'fields': 'files(id)'},
+                                    headers=self.headers)
+        response.raise_for_status()
+        for file in response.json()['files']:
+            self.session.delete(
+                f"{GOOGLE_API_BASE_URL}/drive/v3/files/{file['id']}",
+                headers=self.headers).raise_for_status()
+
+
+class OnedriveDestination(BackupDestination):
+    """Onedrive folder, files are addressed by path below the folder"""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.folder = config.onedrive_folder_key
+        self.location = self.folder
+        self.chunk_size = config.onedrive_chunk_size * 1024
+        self.headers = {
+            'Authorization': f'Bearer {config.onedrive_access_token}',
+            'Content-Type': 'application/json'
+        }
+
+    def _item_url(self, name):
+        return (f"{MICROSOFT_GRAPH_END_POINT}/v1.0/me/drive/items/"
+                f"{self.folder}:/{quote(name)}")
+
+    def create_upload_session(self, name):
+        """Create an upload session for `name` and return its upload URL"""
+        upload_session = self.session.post(
+            self._item_url(name) + ':/createUploadSession',
+            headers=self.headers)
+        upload_session.raise_for_status()
+        upload_url = upload_session.json().get('uploadUrl')
+        if not upload_url:
+            raise ValueError("Failed to get upload URL from OneDrive")
+        return upload_url
+
+    def _open_write(self, name, size=None):
+        """Upload sessions expect the total size of the file with every
+        chunk, a streamed backup of unknown size can not be sent"""
+        if size is None:
+            raise ValueError("OneDrive needs the size of the file to upload,"
+                             " streaming upload is not supported")
+        return OnedriveUpload(self.create_upload_session(name),
+                              chunk_size=self.chunk_size,
+                              session=self.session, total_size=size)
+
+    def delete(self, name):
+        self.session.delete(self._item_url(name),
+                            headers=self.headers).raise_for_status()
+
+    def open_read(self, name):
+        return self._open_url(self._item_url(name) + ':/content',
+                              self.session, headers=self.headers)
+
+    def list_files(self):
+        """List the folder, following the `@odata.nextLink` of every page of
+        the result"""
+        list_url = (f"{MICROSOFT_GRAPH_END_POINT}/v1.0/me/drive/items/"
+                    f"{self.folder}/children")
+        files = []
+        while list_url:
+            response = self.session.get(list_url, headers=self.headers)
+            response.raise_for_status()
+            result = response.json()
+            files += [
+                BackupFile(file['name'],
+                           _parse_iso_datetime(file['createdDateTime']),
+                           file.get('size'), file['id'])
+                for file in result.get('value', [])
+                if 'folder' not in file
+            ]
+            list_url = result.get('@odata.nextLink')
+        return files
+
+
+class DropboxDestination(BackupDestination):
+    """Dropbox folder"""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.app_key = config.dropbox_client_key
+        self.app_secret = config.dropbox_client_secret
+        self.refresh_token = config.dropbox_refresh_token
+        self.folder = config.dropbox_folder
+        self.location = self.folder
+        self.dbx = None
+
+    def connect(self):
+        self.dbx = _dropbox_client(self.app_key, self.app_secret,
+                                   self.refresh_token)
+
+    def _open_write(self, name, size=None):
+        return DropboxUploadSession(self.dbx, self.folder + '/' + name)
+
+    def delete(self, name):
+        self.dbx.files_delete_v2(self.folder + '/' + name)
+
+    def open_read(self, name):
+        _metadata, response = self.dbx.files_download(
+            self.folder + '/' + name)
+        return io.BufferedReader(HttpDownload(response), COPY_CHUNK_SIZE)
+
+    def download_file(self, name, path):
+        self.dbx.files_download_to_file(path, self.folder + '/' + name)
+
+    def list_files(self):
+        """List the folder, continuing the listing while Dropbox has more
+        entries"""
+        result = self.dbx.files_list_folder(self.folder)
+        entries = list(result.entries)
+        while result.has_more:
+            result = self.dbx.files_list_folder_continue(result.cursor)
+            entries += result.entries
+        return [
+            BackupFile(entry.name, entry.client_modified, entry.size,
+                       entry.path_display)
+            for entry in entries
+            if isinstance(entry, dropbox.files.FileMetadata)
+        ]
+
+
+class NextcloudDestination(BackupDestination):
+    """Nextcloud folder, accessed through WebDAV. All the requests go through
+    one keep-alive session authenticated with the credentials of the
+    configuration. The session is not shared with the other destinations,
+    so that the session cookie set by Nextcloud stays tied to one user."""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.domain = config.domain
+        self.user = config.next_cloud_user_name
+        self.password = config.next_cloud_password
+        self.folder = config.nextcloud_folder_key
+        self.location = f"{self.domain}/{self.folder}"
+        self.dav = None
+        self._folders = set()
+
+    def connect(self):
+        self.dav = new_http_session(pool_size=1)
+        self.dav.auth = (self.user, self.password)
+        response = self.dav.request('PROPFIND', self._url(''),
+                                    headers={'Depth': '0'})
+        if response.status_code == 404:
+            self.dav.request('MKCOL', self._url('')).raise_for_status()
+        else:
+            response.raise_for_status()
+
+    def close(self):
+        self.dav.close()
+
+    def _url(self, name):
+        """Return the WebDAV URL of the file `name` of the folder"""
+        return (f"{self.domain.rstrip('/')}/remote.php/dav/files/"
+                f"{quote(self.user)}/{quote(self.folder.strip('/'))}/"
+                f"{quote(name)}")
+
+    def _make_folders(self, name):
+        """Create the sub folders of `name` missing on the server"""
+        folder = ''
+        for part in name.split('/')[:-1]:
+            folder = folder + '/' + part if folder else part
+            if folder not in self._folders:
+                response = self.dav.request('MKCOL', self._url(folder))
+                # 405 when the folder already exists
+                if response.status_code != 405:
+                    response.raise_for_status()
+                self._folders.add(folder)
+
+    def _open_write(self, name, size=None):
+        self._make_folders(name)
+        upload_url = (f"{self.domain.rstrip('/')}/remote.php/dav/uploads/"
+                      f"{quote(self.user)}/backup-{uuid.uuid4().hex}")
+        return NextcloudChunkedUpload(self.dav, upload_url, self._url(name))
+
+    def delete(self, name):
+        response = self.dav.delete(self._url(name))
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def open_read(self, name):
+        return self._open_url(self._url(name), self.dav)
+
+    def list_files(self):
+        """List the folder with a single PROPFIND request"""
+        response = self.dav.request(
+            'PROPFIND', self._url(''), headers={'Depth': '1'},
+            data=NEXTCLOUD_PROPFIND_BODY)
+        response.raise_for_status()
+        files = []
+        for item in ElementTree.fromstring(response.content).iter(
+                '{DAV:}response'):
+            prop = item.find('{DAV:}propstat/{DAV:}prop')
+            if prop is None or prop.find(
+                    '{DAV:}resourcetype/{DAV:}collection') is not None:
+                continue
+            files.append(BackupFile(
+                unquote(item.findtext('{DAV:}href').rstrip('/')
+                        .rsplit('/', 1)[-1]),
+                _to_naive_utc(parsedate_to_datetime(
+                    prop.findtext('{DAV:}getlastmodified'))),
+                int(prop.findtext('{DAV:}getcontentlength') or 0)))
+        return files
+
+
+class S3Destination(BackupDestination):
+    """Folder of an Amazon S3 bucket"""
+
+    def __init__(self, config, session=None):
+        super().__init__(config, session)
+        self.access_key = config.aws_access_key
+        self.secret_key = config.aws_secret_access_key
+        self.bucket = config.bucket_file_name
+        self.folder = config.aws_folder_name
+        self.location = f"s3://{self.bucket}/{self.folder}"
+        self.transfer_config = TransferConfig(
+            multipart_threshold=config.aws_multipart_threshold * MB,
+            multipart_chunksize=config.aws_multipart_chunksize * MB,
+            max_concurrency=config.aws_max_concurrency)
+        self.client = None
+
+    def connect(self):
+        self.client = _s3_client(self.access_key, self.secret_key)
+        # Only look under the folder prefix, and create the folder marker
+        # if the folder doesn't exist yet
+        response = self.client.list_objects_v2(
+            Bucket=self.bucket, Prefix=self._key(''), MaxKeys=1)
+        if not response.get('KeyCount'):
+            self.client.put_object(Bucket=self.bucket, Key=self._key(''))
+
+    def _key(self, name):
+        return f"{self.folder}/{name}"
+
+    def _open_write(self, name, size=None):
+        return S3MultipartUpload(
+            self.client, self.bucket, self._key(name),
+            chunk_size=self.transfer_config.multipart_chunksize,
+            max_concurrency=self.transfer_config.max_concurrency, size=size)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def open_read(self, name):
+        return self.client.get_object(Bucket=self.bucket,
+                                      Key=self._key(name))['Body']
+
+    def download_file(self, name, path):
+        """Download with parallel ranged requests, like the uploads"""
+        self.client.download_file(self.bucket, self._key(name), path,
+                                  Config=self.transfer_config)
+
+    def upload_file(self, path, name):
+        self.client.upload_file(
+            path, self.bucket, self._key(name), Config=self.transfer_config,
+            Callback=self.throttle.consume if self.throttle else None)
+
+    def list_files(self):
+        """List every page of the folder. The delimiter keeps the listing
+        out of the sub folders, such as the incremental filestore."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        files = []
+        for page in paginator.paginate(Bucket=self.bucket,
+                                       Prefix=self._key(''), Delimiter='/'):
+            for file in page.get('Contents', []):
+                name = file['Key'][len(self._key('')):]
+                if not name:
+                    continue
+                files.append(BackupFile(
+                    name, _to_naive_utc(file['LastModified']), file['Size'],
+                    file['Key']))
+        return files
+
+    def delete_backups(self, names):
+        self.delete_files([BackupFile(name, None, key=self._key(name))
+                           for name in names])
+
+    def delete_files(self, files):
+        """Delete the files with requests of S3_DELETE_BATCH_SIZE keys"""
+        for index in range(0, len(files), S3_DELETE_BATCH_SIZE):
+            response = self.client.delete_objects(
+                Bucket=self.bucket, Delete={
+                    'Objects': [{'Key': file.key} for file in
+                                files[index:index + S3_DELETE_BATCH_SIZE]],
+                    'Quiet': True,
+                })
+            if response.get('Errors'):
+                error = response['Errors'][0]
+                raise ValueError("Unable to delete %s from S3: %s" % (
+                    error['Key'], error['Message']))
+
+
+def new_http_session(pool_size=HTTP_POOL_SIZE):
+    """Return a requests.Session keeping up to `pool_size` connections per
+    host alive, to be shared by the requests of a backup run"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@lru_cache(maxsize=32)
+def _s3_client(access_key, secret_key):
+    """Return the boto3 S3 client of the credentials, clients are thread
+    safe and reused across backups to keep their connection pool"""
+    return boto3.client('s3', aws_access_key_id=access_key,
+                        aws_secret_access_key=secret_key)
+
+
+@lru_cache(maxsize=32)
+def _dropbox_client(app_key, app_secret, refresh_token):
+    """Return the Dropbox client of the credentials, reused across backups
+    to keep its access token and connection pool"""
+    return dropbox.Dropbox(app_key=app_key, app_secret=app_secret,
+                           oauth2_refresh_token=refresh_token)
+
+
+def _to_naive_utc(value):
+    """Convert a timezone aware datetime to a naive UTC datetime"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_iso_datetime(value):
+    """Parse the ISO 8601 UTC timestamps returned by Google Drive and
+    Onedrive, such as 2024-05-13T10:21:03.254Z"""
+    return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+BACKUP_DESTINATIONS = {
+    'local': LocalDestination,
+    'ftp': FtpDestination,
+    'sftp': SftpDestination,
+    'google_drive': GoogleDriveDestination,
+    'onedrive': OnedriveDestination,
+    'dropbox': DropboxDestination,
+    'next_cloud': NextcloudDestination,
+    'amazon_s3': S3Destination,
+}
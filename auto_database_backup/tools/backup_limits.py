@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import time
+from contextlib import nullcontext
+from threading import BoundedSemaphore, Lock
+
+
+class BackupLimits:
+    """Bounds on the work done concurrently during a backup run, shared by
+    all the threads of the run. A limit of 0 means unlimited.
+
+    :param max_dumps: number of pg_dump running at the same time against
+        the PostgreSQL cluster of the server
+    :param max_uploads: dictionary giving for a destination type the number
+        of backups uploaded at the same time to that type of destination
+    """
+
+    def __init__(self, max_dumps=0, max_uploads=None):
+        self._dumps = BoundedSemaphore(max_dumps) if max_dumps > 0 else None
+        self._uploads = {
+            destination: BoundedSemaphore(limit)
+            for destination, limit in (max_uploads or {}).items()
+            if limit > 0
+        }
+
+    def dump(self):
+        """Context manager held while a database is dumped"""
+        return self._dumps or nullcontext()
+
+    def upload(self, destination):
+        """Context manager held while a backup is uploaded to a destination
+        of type `destination`"""
+        return self._uploads.get(destination) or nullcontext()
+
+
+class TokenBucket:
+    """Bandwidth limit of `rate` bytes per second, allowing bursts of up to
+    one second of traffic. consume() blocks the caller until the amount of
+    data it is about to send fits in the limit. Thread-safe, so a bucket can
+    be shared by parallel uploads."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.timestamp = time.monotonic()
+        self._lock = Lock()
+
+    def consume(self, amount):
+        """Wait until `amount` bytes can be sent. Amounts larger than the
+        burst are allowed, the following calls wait for the debt."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens +
+                              (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
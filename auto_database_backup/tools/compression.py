@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import gzip
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Extension appended to the backup filename for each codec
+COMPRESSION_EXTENSIONS = {
+    'gzip': 'gz',
+    'zstd': 'zst',
+    'lz4': 'lz4',
+}
+# Accepted compression levels and level used when none is given
+COMPRESSION_LEVELS = {
+    'gzip': (1, 9, 6),
+    'zstd': (1, 22, 3),
+    'lz4': (0, 16, 0),
+}
+
+
+def is_codec_available(codec):
+    """Whether the python library implementing `codec` is installed"""
+    return {
+        'gzip': True,
+        'zstd': zstandard is not None,
+        'lz4': lz4 is not None,
+    }.get(codec, False)
+
+
+def open_compressor(stream, codec, level=None, threads=0):
+    """Return a writable file object compressing the data written to it into
+    `stream` with `codec`. Closing it flushes the compressed data but leaves
+    `stream` open.
+
+    :param level: compression level, the codec default when not set
+    :param threads: number of threads compressing in parallel, only used by
+        zstd, 0 uses all the CPUs of the server
+    """
+    if level is None:
+        level = COMPRESSION_LEVELS[codec][2]
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=level)
+    if codec == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level,
+                                              threads=threads or -1)
+        return compressor.stream_writer(stream, closefd=False)
+    if codec == 'lz4':
+        return lz4.frame.LZ4FrameFile(stream, mode='wb',
+                                      compression_level=level)
+    raise ValueError("Unknown compression codec %r" % codec)
+
+
+def open_decompressor(stream, codec):
+    """Return a readable file object decompressing the data of `stream`
+    compressed with `codec`. Closing it leaves `stream` open."""
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(stream,
+                                                          closefd=False)
+    if codec == 'lz4':
+        return lz4.frame.LZ4FrameFile(stream, mode='rb')
+    raise ValueError("Unknown compression codec %r" % codec)
+
+
+def get_filename_codec(filename):
+    """Return the codec of the backup file `filename` from its extension,
+    None when it is not compressed"""
+    for codec, extension in COMPRESSION_EXTENSIONS.items():
+        if filename.endswith('.' + extension):
+            return codec
+    return None
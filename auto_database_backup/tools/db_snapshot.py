@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import re
+import odoo
+
+
+class DatabaseSnapshot:
+    """Read-only transaction on a database whose snapshot is exported with
+    pg_export_snapshot(). pg_dump started with `--snapshot=<snapshot_id>` and
+    the queries run on `cr` see the database at the same point in time, so
+    the dump, its manifest and the filestore files backed up agree with each
+    other. The snapshot is valid until close() ends the transaction."""
+
+    def __init__(self, db_name):
+        self.cr = odoo.sql_db.db_connect(db_name).cursor()
+        try:
+            self.cr.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ,'
+                            ' READ ONLY')
+            self.cr.execute('SELECT pg_export_snapshot()')
+            self.snapshot_id = self.cr.fetchone()[0]
+        except Exception:
+            self.cr.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """End the transaction, the snapshot cannot be used anymore"""
+        if not self.cr.closed:
+            self.cr.close()
+
+    def filestore_files(self):
+        """Return the sorted paths, relative to the filestore, of the files
+        of the attachments existing in the snapshot. The paths are cleaned
+        like ir.attachment does before reading a file."""
+        self.cr.execute("""SELECT DISTINCT store_fname FROM ir_attachment
+                           WHERE store_fname IS NOT NULL""")
+        return sorted({re.sub('[.:]', '', name).strip('/\\')
+                       for name, in self.cr.fetchall()} - {''})
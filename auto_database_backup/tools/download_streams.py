@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import ftplib
+import io
+import ssl
+
+
+class HttpDownload(io.RawIOBase):
+    """Readable stream of the body of a streamed requests.Response, with
+    the content encoding of the server removed. Closing it releases the
+    connection."""
+
+    def __init__(self, response):
+        response.raise_for_status()
+        response.raw.decode_content = True
+        self.response = response
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.response.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.response.close()
+        super().close()
+
+
+class FtpDownload(io.RawIOBase):
+    """Readable stream of the file `name` of a FTP server, read from the
+    data connection of a `RETR` command. With FTPS the TLS session of a
+    data connection read to the end is shut down before it is closed, like
+    ftplib.retrbinary() does."""
+
+    def __init__(self, ftp, name):
+        self.ftp = ftp
+        self.ftp.voidcmd('TYPE I')
+        self.connection = ftp.transfercmd('RETR %s' % name)
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.connection.recv_into(buffer)
+        self._eof = not size
+        return size
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self._eof and isinstance(self.connection, ssl.SSLSocket):
+                    self.connection.unwrap()
+            finally:
+                self.connection.close()
+            try:
+                self.ftp.voidresp()
+            except ftplib.all_errors:
+                # The server reports the transfer aborted when the file was
+                # not read to the end
+                if self._eof:
+                    raise
+        super().close()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import json
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of the blocks copied between the PostgreSQL tools and the streams
+PG_TOOL_CHUNK_SIZE = 1024 * 1024
+# Bytes of the end of the error output of a failed tool which are reported
+PG_TOOL_ERROR_TAIL = 4096
+# WAL segments, backup history files and timeline history files archived by
+# PostgreSQL. Partial segments and temporary files are not shipped.
+WAL_FILE_PATTERN = re.compile(
+    r'^([0-9A-F]{24}(\.[0-9A-F]{8}\.backup)?|[0-9A-F]{8}\.history)$')
+# Safe extraction of the archives where the Python version supports it
+TAR_EXTRACT_ARGS = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') \
+    else {}
+# Threads writing the filestore of a zip archive during a restore
+RESTORE_FILESTORE_WORKERS = 8
+
+
+class PgToolError(Exception):
+    """A PostgreSQL tool exited with an error, `error` is the end of its
+    error output"""
+
+    def __init__(self, tool, returncode, error):
+        super().__init__('%s failed with exit code %s: %s' % (
+            tool, returncode, error))
+        self.tool = tool
+        self.returncode = returncode
+        self.error = error
+
+
+def run_pg_tool(cmd, env, stream=None, source=None, tool='pg_dump'):
+    """Run the PostgreSQL tool `cmd` and copy its output to `stream` in
+    blocks of PG_TOOL_CHUNK_SIZE, so the output is never held in memory as a
+    whole. Without `stream` the tool is expected to write its output to a
+    file. The readable `source` is copied to its input, e.g. for pg_restore.
+    The error output is spooled to a temporary file and its tail is raised
+    in a PgToolError when the tool fails, `tool` naming it.
+
+    :return: the peak resident memory of the process in MiB, None where the
+        platform does not report it
+    """
+    peak_rss = None
+    with tempfile.TemporaryFile() as error_file:
+        process = subprocess.Popen(
+            cmd, env=env,
+            stdin=subprocess.PIPE if source else subprocess.DEVNULL,
+            stdout=subprocess.PIPE if stream else subprocess.DEVNULL,
+            stderr=error_file)
+        try:
+            if stream:
+                shutil.copyfileobj(process.stdout, stream, PG_TOOL_CHUNK_SIZE)
+            if source:
+                try:
+                    shutil.copyfileobj(source, process.stdin,
+                                       PG_TOOL_CHUNK_SIZE)
+                    process.stdin.close()
+                except BrokenPipeError:
+                    # The tool stopped reading, its exit code and error
+                    # output tell why
+                    pass
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            if process.stdout:
+                process.stdout.close()
+            if hasattr(os, 'wait4'):
+                # Reap the process ourselves to get its own resource usage,
+                # ru_maxrss is in KiB
+                _pid, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                peak_rss = usage.ru_maxrss / 1024
+            returncode = process.wait()
+        if returncode:
+            error_file.seek(0, os.SEEK_END)
+            error_file.seek(max(error_file.tell() - PG_TOOL_ERROR_TAIL, 0))
+            raise PgToolError(tool, returncode,
+                              error_file.read().decode(errors='replace')
+                              .strip())
+    return peak_rss
+
+
+def basebackup_command(pg_basebackup, label):
+    """Return the command writing a base backup of the cluster as a tar
+    archive on the standard output, with the WAL needed to make it
+    consistent"""
+    return [pg_basebackup, '--pgdata=-', '--format=tar', '--wal-method=fetch',
+            '--checkpoint=fast', '--label=' + label]
+
+
+def list_wal_files(folder):
+    """Return the names of the files archived by PostgreSQL into `folder`,
+    in the order they were written"""
+    return sorted(name for name in os.listdir(folder)
+                  if WAL_FILE_PATTERN.match(name))
+
+
+def is_wal_needed(name, first_segment):
+    """Tell whether the archived WAL file `name` is needed to recover a base
+    backup starting at the segment `first_segment`. Like pg_archivecleanup,
+    the timeline, the first 8 characters, is not compared and the timeline
+    history files are always needed."""
+    return name.endswith('.history') or name[8:24] >= first_segment[8:24]
+
+
+def extract_base_backup(source, pgdata):
+    """Extract the base backup tar archive read from `source` into the new
+    data folder `pgdata`"""
+    os.makedirs(pgdata, mode=0o700, exist_ok=True)
+    # PostgreSQL refuses to start on a data folder open to others
+    os.chmod(pgdata, 0o700)
+    with tarfile.open(fileobj=source, mode='r|') as tar:
+        tar.extractall(pgdata, **TAR_EXTRACT_ARGS)
+
+
+def write_recovery_config(pgdata, wal_dir, target_time):
+    """Configure the cluster of `pgdata` to replay the WAL files of
+    `wal_dir` up to `target_time`, a naive UTC datetime, then to promote.
+    The archiving configured on the source cluster is turned off: the copy
+    would otherwise archive its new timeline into the WAL archive folder of
+    the source."""
+    with open(os.path.join(pgdata, 'recovery.signal'), 'w'):
+        pass
+    with open(os.path.join(pgdata, 'postgresql.auto.conf'), 'a') as conf:
+        conf.write(
+            f"restore_command = 'cp \"{wal_dir}/%f\" \"%p\"'\n"
+            f"recovery_target_time = '{target_time} UTC'\n"
+            f"recovery_target_action = 'promote'\n"
+            f"archive_mode = off\n")
+
+
+def restore_backup(source, name, db_name, env, pg_tool, jobs=1,
+                   filestore=None, workers=RESTORE_FILESTORE_WORKERS):
+    """Restore the backup archive `name`, read uncompressed from `source`,
+    into the empty database `db_name`. Dump format backups are spooled to a
+    temporary file and Directory format archives are unpacked on the fly,
+    then both are restored with `jobs` parallel pg_restore jobs, which need
+    a seekable file. Zip archives, which need random access as well, are
+    spooled to a temporary file then loaded by psql while their filestore
+    is written by `workers` threads.
+
+    :param pg_tool: function returning the path of a PostgreSQL program
+        from its name, e.g. odoo.tools.misc.find_pg_tool
+    :param filestore: folder receiving the filestore of a zip archive, which
+        is not extracted when it is None
+    :return: the manifest of the backup, empty for the Dump format which has
+        none
+    """
+    if name.endswith('.zip'):
+        with tempfile.TemporaryFile() as temp:
+            shutil.copyfileobj(source, temp, PG_TOOL_CHUNK_SIZE)
+            with zipfile.ZipFile(temp) as zipf, \
+                    ThreadPoolExecutor(max_workers=workers) as executor:
+                members = [member for member in zipf.namelist()
+                           if member.startswith('filestore/')
+                           and not member.endswith('/')] if filestore else []
+                futures = [executor.submit(extract_zip_files, zipf,
+                                           members[index::workers],
+                                           filestore)
+                           for index in range(workers) if members[index:]]
+                with zipf.open('dump.sql') as dump:
+                    run_pg_tool([pg_tool('psql'), '--quiet',
+                                 '--dbname=' + db_name], env,
+                                source=dump, tool='psql')
+                for future in futures:
+                    future.result()
+                return json.loads(zipf.read('manifest.json'))
+    if name.endswith('.tar'):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            with tarfile.open(fileobj=source, mode='r|') as tar:
+                tar.extractall(dump_dir, **TAR_EXTRACT_ARGS)
+            run_pg_tool([pg_tool('pg_restore'), '--no-owner',
+                         '--jobs=%s' % (jobs or 1), '--dbname=' + db_name,
+                         os.path.join(dump_dir, 'dump')], env,
+                        tool='pg_restore')
+            with open(os.path.join(dump_dir, 'manifest.json')) as fh:
+                return json.load(fh)
+    with tempfile.TemporaryDirectory() as dump_dir:
+        dump_path = os.path.join(dump_dir, 'dump')
+        with open(dump_path, 'wb') as dump:
+            shutil.copyfileobj(source, dump, PG_TOOL_CHUNK_SIZE)
+        run_pg_tool([pg_tool('pg_restore'), '--no-owner',
+                     '--jobs=%s' % (jobs or 1), '--dbname=' + db_name,
+                     dump_path], env, tool='pg_restore')
+    return {}
+
+
+def filestore_path(filestore, name):
+    """Return the path of the file `name` of `filestore`, with its folder
+    created. Names leaving the filestore are refused."""
+    filestore = os.path.normpath(filestore)
+    path = os.path.normpath(os.path.join(filestore, name))
+    if not path.startswith(os.path.join(filestore, '')):
+        raise ValueError('Invalid filestore file %s' % name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def extract_zip_files(zipf, members, filestore):
+    """Extract the `filestore/` members of the ZipFile `zipf` into
+    `filestore`, run in a thread"""
+    for member in members:
+        with zipf.open(member) as source, open(filestore_path(
+                filestore, member[len('filestore/'):]), 'wb') as target:
+            shutil.copyfileobj(source, target, PG_TOOL_CHUNK_SIZE)
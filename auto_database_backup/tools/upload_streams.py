@@ -0,0 +1,652 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import hashlib
+import io
+import logging
+import os
+import ssl
+import time
+from collections import deque
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED,
+                                ThreadPoolExecutor, wait)
+
+import dropbox
+import requests
+
+_logger = logging.getLogger(__name__)
+# Default size of the parts sent to the remote storage
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Number of times a chunk of a resumable upload is sent again after a
+# transient failure, the delay between the attempts doubles each time
+UPLOAD_RETRIES = 5
+UPLOAD_RETRY_DELAY = 1
+UPLOAD_RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+# SFTP channels an upload is written through in parallel, and size of the
+# chunks dispatched between them
+SFTP_UPLOAD_CHANNELS = 4
+SFTP_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class ChunkedUploadStream(io.RawIOBase):
+    """Writable file object which uploads the data written to it in parts
+    of `chunk_size` bytes, so a backup can be sent to the remote storage
+    while it is being generated. At most one part is kept in memory.
+
+    Used as a context manager, the upload is completed when the block exits
+    normally and aborted when it raises."""
+
+    def __init__(self, chunk_size=UPLOAD_CHUNK_SIZE):
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.offset = 0
+        # TokenBucket limiting the upload bandwidth, set by the destination
+        self.throttle = None
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        """Buffer `data` and upload every full part. The last part is kept
+        back until close() so that it can be flagged as final."""
+        if self.closed:
+            raise ValueError("I/O operation on closed upload stream.")
+        self._buffer += data
+        while len(self._buffer) > self.chunk_size:
+            chunk = bytes(self._buffer[:self.chunk_size])
+            del self._buffer[:self.chunk_size]
+            self._consume(len(chunk))
+            self._upload_chunk(chunk, final=False)
+            self.offset += len(chunk)
+        return len(data)
+
+    def close(self):
+        """Upload the remaining data and complete the upload. The upload is
+        aborted if this fails, so no partial file is left behind."""
+        if self.closed:
+            return
+        try:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            self._consume(len(chunk))
+            self._upload_chunk(chunk, final=True)
+            self.offset += len(chunk)
+            self._complete()
+        except BaseException:
+            self.abort()
+            raise
+        super().close()
+
+    def abort(self):
+        """Discard the upload, nothing is stored on the remote side"""
+        if self.closed:
+            return
+        self._buffer.clear()
+        try:
+            self._abort()
+        except Exception as error:
+            _logger.warning('Unable to abort upload: %s', error)
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __del__(self):
+        """A stream dropped without being closed belongs to an interrupted
+        backup: abort it instead of completing the upload like IOBase."""
+        if not self.closed:
+            self.abort()
+
+    def _consume(self, size):
+        """Wait for the bandwidth limit to allow sending `size` bytes"""
+        if self.throttle:
+            self.throttle.consume(size)
+
+    def _upload_chunk(self, chunk, final):
+        """Send `chunk`, which starts at `self.offset` in the file"""
+        raise NotImplementedError()
+
+    def _complete(self):
+        """Hook called once the last chunk has been sent"""
+
+    def _abort(self):
+        """Hook called to cancel the upload on the remote side"""
+
+
+class CountingWriter(io.RawIOBase):
+    """Writable file object passing the data written to it on to `stream`
+    while counting its size. `stream` is left open."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        self.stream.write(data)
+        return len(data)
+
+    def flush(self):
+        if not self.stream.closed:
+            self.stream.flush()
+
+
+class ChecksumWriter(CountingWriter):
+    """CountingWriter computing the checksum of the data as well"""
+
+    def __init__(self, stream, algorithm='sha256'):
+        super().__init__(stream)
+        self._hash = hashlib.new(algorithm)
+
+    def write(self, data):
+        self._hash.update(data)
+        return super().write(data)
+
+    def hexdigest(self):
+        """Return the checksum of the data written so far"""
+        return self._hash.hexdigest()
+
+
+class LocalFileUpload(ChunkedUploadStream):
+    """Write to a local file. The data goes to a `.part` file which is only
+    renamed to `path` once complete, so an aborted backup leaves nothing."""
+
+    def __init__(self, path, chunk_size=UPLOAD_CHUNK_SIZE):
+        super().__init__(chunk_size)
+        self.path = path
+        self.file = open(path + '.part', 'wb')
+
+    def _upload_chunk(self, chunk, final):
+        self.file.write(chunk)
+
+    def _complete(self):
+        self.file.close()
+        os.replace(self.file.name, self.path)
+
+    def _abort(self):
+        self.file.close()
+        os.remove(self.file.name)
+
+
+class FtpUpload(ChunkedUploadStream):
+    """Upload to a FTP server through the data connection of a `STOR`. With
+    FTPS the TLS session of the data connection is shut down before it is
+    closed, like ftplib.storbinary() does, as some servers require it."""
+
+    def __init__(self, ftp, name, chunk_size=UPLOAD_CHUNK_SIZE):
+        super().__init__(chunk_size)
+        self.ftp = ftp
+        self.name = name
+        self.ftp.voidcmd('TYPE I')
+        self.connection = ftp.transfercmd('STOR %s' % name)
+
+    def _upload_chunk(self, chunk, final):
+        self.connection.sendall(chunk)
+
+    def _complete(self):
+        if isinstance(self.connection, ssl.SSLSocket):
+            self.connection.unwrap()
+        self.connection.close()
+        self.ftp.voidresp()
+
+    def _abort(self):
+        self.connection.close()
+        try:
+            self.ftp.voidresp()
+        finally:
+            self.ftp.delete(self.name)
+
+
+class SftpUpload(ChunkedUploadStream):
+    """Upload to a SFTP server, the chunks being written at their offsets
+    through up to `channels` SFTP channels in parallel, one thread each.
+    A single file handle stalls for a round trip every time paramiko waits
+    for the acknowledgements of its pipelined writes, and is bounded by the
+    flow control window of one channel on the server side: the channels hide
+    each other's stalls and add their windows. The extra channels are opened
+    by `open_channel` once the file outgrows the first chunks, so small
+    files use `sftp` only, and they are closed with the upload. At most two
+    chunks per channel are kept in memory.
+
+    As the write errors of pipelined requests may go unreported, the size
+    of the uploaded file is checked once complete, like sftp.put() does."""
+
+    def __init__(self, sftp, name, open_channel=None,
+                 channels=SFTP_UPLOAD_CHANNELS,
+                 chunk_size=SFTP_UPLOAD_CHUNK_SIZE):
+        super().__init__(chunk_size)
+        self.sftp = sftp
+        self.name = name
+        self.open_channel = open_channel
+        self.max_channels = channels if open_channel else 1
+        self.channels = []
+        self.files = []
+        self.executors = []
+        self.futures = deque()
+        self._add_channel(sftp, 'wb')
+
+    def _add_channel(self, sftp, mode):
+        """Open the file through `sftp` with a thread writing to it"""
+        if sftp is not self.sftp:
+            self.channels.append(sftp)
+        file = sftp.open(self.name, mode)
+        file.set_pipelined(True)
+        self.files.append(file)
+        self.executors.append(ThreadPoolExecutor(max_workers=1))
+
+    def _write_chunk(self, file, chunk, offset):
+        file.seek(offset)
+        file.write(chunk)
+
+    def _upload_chunk(self, chunk, final):
+        if not chunk:
+            return
+        index = self.offset // self.chunk_size % self.max_channels
+        if index == len(self.files):
+            self._add_channel(self.open_channel(), 'r+b')
+        self.futures.append(self.executors[index].submit(
+            self._write_chunk, self.files[index], chunk, self.offset))
+        while len(self.futures) > 2 * len(self.files):
+            self.futures.popleft().result()
+
+    def _complete(self):
+        while self.futures:
+            self.futures.popleft().result()
+        self._close_channels()
+        size = self.sftp.stat(self.name).st_size
+        if size != self.offset:
+            raise IOError('size mismatch in upload of %s: %s != %s'
+                          % (self.name, size, self.offset))
+
+    def _abort(self):
+        for future in self.futures:
+            future.cancel()
+        try:
+            self._close_channels()
+        finally:
+            self.sftp.remove(self.name)
+
+    def _close_channels(self):
+        """Wait for the threads, close the file handles, the errors of the
+        pipelined writes being raised then, and the extra channels"""
+        try:
+            for executor in self.executors:
+                executor.shutdown()
+            for file in self.files:
+                file.close()
+        finally:
+            self.executors = []
+            self.files = []
+            for sftp in self.channels:
+                sftp.close()
+            self.channels = []
+
+
+class DropboxUploadSession(ChunkedUploadStream):
+    """Upload to Dropbox with an upload session, a file is limited to 150 MB
+    by a single `files_upload` call. Files smaller than one chunk are still
+    sent with `files_upload`. An unfinished session expires on its own, an
+    aborted upload leaves no file."""
+
+    def __init__(self, dbx, path, chunk_size=UPLOAD_CHUNK_SIZE):
+        super().__init__(chunk_size)
+        self.dbx = dbx
+        self.path = path
+        self.session_id = None
+
+    def _upload_chunk(self, chunk, final):
+        if not self.session_id:
+            if final:
+                self.dbx.files_upload(
+                    chunk, self.path, mode=dropbox.files.WriteMode.overwrite)
+            else:
+                self.session_id = self.dbx.files_upload_session_start(
+                    chunk).session_id
+            return
+        cursor = dropbox.files.UploadSessionCursor(
+            session_id=self.session_id, offset=self.offset)
+        if final:
+            self.dbx.files_upload_session_finish(
+                chunk, cursor, dropbox.files.CommitInfo(
+                    path=self.path, mode=dropbox.files.WriteMode.overwrite))
+        else:
+            self.dbx.files_upload_session_append_v2(chunk, cursor)
+
+
+class NextcloudChunkedUpload(ChunkedUploadStream):
+    """Nextcloud WebDAV chunked upload (chunking v2). The chunks are sent to
+    a temporary upload folder which is then moved to the destination file,
+    where the server assembles them. Every chunk except the last one has to
+    be at least 5 MiB. Files smaller than one chunk are sent with a single
+    PUT."""
+    MIN_CHUNK_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, session, upload_url, file_url,
+                 chunk_size=UPLOAD_CHUNK_SIZE):
+        super().__init__(max(chunk_size, self.MIN_CHUNK_SIZE))
+        self.session = session
+        self.upload_url = upload_url
+        self.file_url = file_url
+        self.started = False
+
+    def _upload_chunk(self, chunk, final):
+        if not self.started:
+            if final:
+                self.session.put(self.file_url,
+                                 data=chunk).raise_for_status()
+                return
+            self.session.request(
+                'MKCOL', self.upload_url,
+                headers={'Destination': self.file_url}).raise_for_status()
+            self.started = True
+        if not chunk:
+            return
+        # Chunks are numbered from 1
+        self.session.put(
+            '%s/%s' % (self.upload_url, self.offset // self.chunk_size + 1),
+            data=chunk,
+            headers={'Destination': self.file_url}).raise_for_status()
+
+    def _complete(self):
+        if self.started:
+            self.session.request('MOVE', self.upload_url + '/.file', headers={
+                'Destination': self.file_url,
+                'OC-Total-Length': str(self.offset),
+            }).raise_for_status()
+
+    def _abort(self):
+        if self.started:
+            self.session.delete(self.upload_url)
+
+
+class S3MultipartUpload(ChunkedUploadStream):
+    """Upload to Amazon S3 using the multipart upload API. Every part except
+    the last one has to be at least 5 MiB, and an upload has at most
+    MAX_PARTS parts. Files smaller than one part are stored with a single
+    `put_object`.
+
+    When the `size` of the file is known, the parts are made large enough
+    for it to fit in MAX_PARTS. Otherwise the part size doubles every
+    PARTS_PER_SIZE parts, which lets a streamed backup grow to the 5 TiB
+    limit of S3, and the upload fails as soon as it would need more parts.
+    Up to `max_concurrency` parts are sent in parallel, fewer once the parts
+    have grown: the parts in flight are held in memory, at most
+    `max_concurrency` times the initial part size."""
+    MIN_PART_SIZE = 5 * 1024 * 1024
+    MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+    MAX_PARTS = 10000
+    PARTS_PER_SIZE = 1000
+
+    def __init__(self, client, bucket, key, chunk_size=UPLOAD_CHUNK_SIZE,
+                 max_concurrency=1, size=None):
+        chunk_size = max(chunk_size, self.MIN_PART_SIZE)
+        if size is not None:
+            chunk_size = max(chunk_size, -(-size // self.MAX_PARTS))
+        super().__init__(chunk_size)
+        if chunk_size > self.MAX_PART_SIZE:
+            raise ValueError("%s bytes exceed the size of a S3 multipart"
+                             " upload" % size)
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.max_concurrency = max(max_concurrency, 1)
+        # Bytes of the parts in flight
+        self.memory_limit = self.chunk_size * self.max_concurrency
+        self.part_number = 0
+        self.parts = []
+        self.upload_id = None
+        self._executor = None
+        self._pending = []
+
+    def _upload_chunk(self, chunk, final):
+        if not self.upload_id:
+            if final:
+                self.client.put_object(Bucket=self.bucket, Key=self.key,
+                                       Body=chunk)
+                return
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key)['UploadId']
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency)
+        if final and not chunk:
+            return
+        self.part_number += 1
+        if self.part_number > self.MAX_PARTS:
+            raise ValueError("The upload of %s exceeds the %s parts of a S3"
+                             " multipart upload" % (self.key, self.MAX_PARTS))
+        # Wait for a slot before queuing the part, which bounds the memory
+        # used by the parts in flight
+        slots = max(1, min(self.max_concurrency,
+                           self.memory_limit // len(chunk)))
+        while len(self._pending) >= slots:
+            self._collect(wait_all=False)
+        self._pending.append(self._executor.submit(
+            self._upload_part, self.part_number, chunk))
+        if self.size is None and \
+                self.part_number % self.PARTS_PER_SIZE == 0:
+            self.chunk_size = min(self.chunk_size * 2, self.MAX_PART_SIZE)
+
+    def _upload_part(self, part_number, chunk):
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=chunk)
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def _collect(self, wait_all=True):
+        """Record the uploaded parts, raising the error of a failed one"""
+        done, not_done = wait(
+            self._pending,
+            return_when=ALL_COMPLETED if wait_all else FIRST_COMPLETED)
+        self._pending = list(not_done)
+        for future in done:
+            self.parts.append(future.result())
+
+    def _complete(self):
+        if self.upload_id:
+            try:
+                self._collect()
+            finally:
+                self._executor.shutdown()
+            self.parts.sort(key=lambda part: part['PartNumber'])
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': self.parts})
+
+    def _abort(self):
+        if self.upload_id:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown()
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class ResumableHttpUpload(ChunkedUploadStream):
+    """Upload to a resumable upload session URL (Google Drive resumable
+    upload or Onedrive upload session) with one `Content-Range` PUT request
+    per chunk. Every range carries `total_size` when the size of the file is
+    known, otherwise the final size of a streamed backup is only announced
+    with the last chunk. `chunk_alignment` is the multiple the service
+    requires for the size of the intermediate chunks.
+
+    A chunk failing on a network error or a transient HTTP status is sent
+    again after an exponential backoff, from the offset the service reports
+    having received, for at most `max_retries` times. The rest of a chunk the
+    service acknowledges only in part is sent again at once."""
+    chunk_alignment = 256 * 1024
+
+    def __init__(self, upload_url, headers=None,
+                 chunk_size=UPLOAD_CHUNK_SIZE, session=None,
+                 max_retries=UPLOAD_RETRIES, total_size=None):
+        chunk_size = max(chunk_size // self.chunk_alignment, 1) * \
+            self.chunk_alignment
+        super().__init__(chunk_size)
+        self.upload_url = upload_url
+        self.headers = headers or {}
+        self.session = session or requests
+        self.max_retries = max_retries
+        self.total_size = total_size
+        self.response = None
+
+    def _upload_chunk(self, chunk, final):
+        start = self.offset
+        end = self.offset + len(chunk)
+        attempt = 0
+        while True:
+            try:
+                response = self._put(chunk[start - self.offset:], start,
+                                     final)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                failure = error
+                delay = UPLOAD_RETRY_DELAY * 2 ** attempt
+            else:
+                if response.status_code in UPLOAD_RETRY_STATUSES:
+                    failure = requests.HTTPError(
+                        '%s error while uploading' % response.status_code,
+                        response=response)
+                    retry_after = response.headers.get('Retry-After', '')
+                    delay = int(retry_after) if retry_after.isdigit() else \
+                        UPLOAD_RETRY_DELAY * 2 ** attempt
+                else:
+                    response.raise_for_status()
+                    received = self._received_offset(response)
+                    if received is None or received >= end:
+                        self.response = response
+                        return
+                    if received < self.offset:
+                        raise ValueError("The upload can not be resumed from"
+                                         " byte %s" % received)
+                    if received > start:
+                        # Only part of the chunk was stored, the rest is sent
+                        # again at once
+                        start = received
+                        continue
+                    failure = requests.HTTPError(
+                        'The bytes from %s were not received' % start,
+                        response=response)
+                    delay = UPLOAD_RETRY_DELAY * 2 ** attempt
+            if attempt == self.max_retries:
+                raise failure
+            attempt += 1
+            _logger.warning('Upload of the chunk at %s failed (%s), retrying'
+                            ' in %s seconds', start, failure, delay)
+            time.sleep(delay)
+            start = self._get_resume_offset(start)
+            if start > end or start < self.offset:
+                raise ValueError("The upload can not be resumed from byte"
+                                 " %s" % start)
+            if start == end and chunk and not final:
+                # The whole chunk was received, only the response was lost
+                return
+
+    def _put(self, chunk, start, final):
+        """Send `chunk` starting at byte `start` of the file"""
+        if self.total_size is not None:
+            total = self.total_size
+        else:
+            total = start + len(chunk) if final else '*'
+        if chunk:
+            content_range = 'bytes %s-%s/%s' % (
+                start, start + len(chunk) - 1, total)
+        else:
+            content_range = 'bytes */%s' % total
+        headers = dict(self.headers, **{
+            'Content-Length': str(len(chunk)),
+            'Content-Range': content_range,
+        })
+        return self.session.put(self.upload_url, headers=headers, data=chunk)
+
+    def _get_resume_offset(self, start):
+        """Return the offset the upload has to continue from, according to
+        the service. `start` is kept when the service can not be queried."""
+        try:
+            offset = self._query_offset()
+        except (requests.RequestException, ValueError) as error:
+            _logger.warning('Unable to query the status of the upload: %s',
+                            error)
+            return start
+        return start if offset is None else offset
+
+    def _query_offset(self):
+        """Ask the service the number of bytes received, None if unknown"""
+        return None
+
+    def _received_offset(self, response):
+        """Return the number of bytes of the file the service acknowledges in
+        the successful `response` to a chunk, None if it does not say"""
+        return None
+
+    def _abort(self):
+        self.session.delete(self.upload_url, headers=self.headers)
+
+
+class GoogleDriveUpload(ResumableHttpUpload):
+    """Google Drive resumable upload, chunks are multiples of 256 KiB"""
+    chunk_alignment = 256 * 1024
+
+    def _query_offset(self):
+        """An empty PUT returns the range received in the Range header"""
+        response = self.session.put(self.upload_url, headers=dict(
+            self.headers, **{'Content-Length': '0',
+                             'Content-Range': 'bytes */*'}))
+        if response.status_code != 308:
+            response.raise_for_status()
+        return self._received_offset(response)
+
+    def _received_offset(self, response):
+        """A 308 response reports the range received in its Range header"""
+        if response.status_code != 308:
+            return None
+        received = response.headers.get('Range')
+        return int(received.split('-')[1]) + 1 if received else 0
+
+
+class OnedriveUpload(ResumableHttpUpload):
+    """Onedrive upload session, chunks are multiples of 320 KiB"""
+    chunk_alignment = 320 * 1024
+
+    def _query_offset(self):
+        """The upload session lists the ranges it still expects"""
+        response = self.session.get(self.upload_url)
+        response.raise_for_status()
+        return self._expected_offset(response)
+
+    def _received_offset(self, response):
+        """A 202 response lists the ranges still expected"""
+        if response.status_code != 202:
+            return None
+        return self._expected_offset(response)
+
+    @staticmethod
+    def _expected_offset(response):
+        """Return the start of the first range still expected"""
+        ranges = response.json().get('nextExpectedRanges')
+        return int(ranges[0].split('-')[0]) if ranges else None
@@ -20,3 +20,4 @@
 #
 ###############################################################################
 from . import dropbox_auth_code
+from . import db_backup_restore
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Cybrosys Techno Solutions (odoo@cybrosys.com)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+import re
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+from odoo.service.db import DBNAME_PATTERN
+
+
+class DbBackupRestore(models.TransientModel):
+    """Wizard queuing the restore of a backup of a configuration as a new
+    database, streamed from the destination of the configuration"""
+    _name = 'db.backup.restore'
+    _description = 'Restore Database Backup'
+
+    backup_config_id = fields.Many2one('db.backup.configure',
+                                       string='Backup Configuration',
+                                       required=True, ondelete='cascade',
+                                       help='Configuration which stored the'
+                                            ' backup')
+    backup_id = fields.Many2one(
+        'db.backup.history', string='Backup', required=True,
+        domain="[('backup_config_id', '=', backup_config_id),"
+               " ('state', '=', 'done'), ('file_type', '=', 'backup'),"
+               " ('wal_segment', '=', False),"
+               " ('name', 'not like', '%.filestore.json')]",
+        help='Backup to restore')
+    db_name = fields.Char(string='New Database Name', required=True,
+                          help='Name of the database created by the restore')
+    neutralize = fields.Boolean(string='Neutralize', default=True,
+                                help='Disable the scheduled actions, the mail'
+                                     ' servers and the other connections to'
+                                     ' external services of the restored'
+                                     ' database')
+
+    @api.constrains('db_name')
+    def _check_db_name(self):
+        """Validate the name of the new database"""
+        for rec in self:
+            if not re.match(DBNAME_PATTERN, rec.db_name):
+                raise ValidationError(_("Invalid Database Name!"))
+
+    def action_restore(self):
+        """Queue the restore of the backup as a restore job and open it. The
+        job is run by the backup runner when the system parameter
+        `auto_database_backup.detached_runner` is set, otherwise by the
+        "Backup : Run Restore Jobs" scheduled action, triggered at once: a
+        restore lasts longer than the time limit of an HTTP worker."""
+        self.backup_config_id._check_restore(self.backup_id, self.db_name)
+        job = self.env['db.backup.job'].create({
+            'job_type': 'restore',
+            'backup_config_ids': [fields.Command.set(
+                self.backup_config_id.ids)],
+            'restore_backup_id': self.backup_id.id,
+            'restore_db_name': self.db_name,
+            'restore_neutralize': self.neutralize,
+        })
+        if not self.env['ir.config_parameter'].sudo().get_param(
+                'auto_database_backup.detached_runner'):
+            self.env.ref(
+                'auto_database_backup.ir_cron_run_backup_jobs')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _("Restore Job"),
+            'res_model': 'db.backup.job',
+            'res_id': job.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }